@@ -2,42 +2,557 @@
 # Main application file for the API Testing & Monitoring Dashboard.
 # Final corrected version for database commits.
 
+import os
+import io
+import re
+import atexit
+import contextlib
+import socket
 import sqlite3
-import requests
+import asyncio
+import gzip
+import functools
+import hashlib
+import heapq
+import multiprocessing
+import math
+import random
+import queue
+import threading
+import importlib.util
+import http.server
+import httpx
+import httpcore
 import time
 import json
-from flask import Flask, render_template, request, redirect, url_for, g, jsonify, abort, flash
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from pathlib import Path
+from urllib.parse import urlsplit
+from flask import Flask, Response, render_template, stream_template, request, redirect, url_for, g, jsonify, abort, flash
 import click
 
+try:
+    import zstandard
+except ImportError:  # optional: response bodies fall back to gzip
+    zstandard = None
+try:
+    import yaml
+except ImportError:  # optional: OpenAPI imports then accept JSON specs only
+    yaml = None
+
 # --- Application Setup ---
 app = Flask(__name__)
 app.config['DATABASE'] = 'api_monitor.db'
 app.config['SECRET_KEY'] = '9f1b8c7e3a5f46f2d1c75e0a2b8d64ff0e28c5c7d9f2d43b1b7e9c8f92a4e1d2'
+app.config['PROBE_TIMEOUT'] = 10            # seconds per probe
+app.config['PROBE_CONNECT_TIMEOUT'] = 3     # seconds to open a connection, so dead hosts fail fast
+app.config['PROBE_MAX_IN_FLIGHT'] = 50      # global cap on concurrent probes
+app.config['PROBE_PER_HOST_LIMIT'] = 4      # concurrent probes against a single host
+app.config['HISTORY_BATCH_SIZE'] = 100      # history rows written per transaction
+app.config['HTTP_POOL_SIZE'] = 10           # keep-alive connections kept per scheme+host
+app.config['HTTP_KEEPALIVE_EXPIRY'] = 60    # seconds an idle pooled connection stays open
+app.config['HTTP2'] = False                 # negotiate HTTP/2 when available (needs `httpx[http2]`)
+app.config['BODY_COMPRESSION'] = 'zstd' if zstandard else 'gzip'
+app.config['BODY_COMPRESSION_LEVEL'] = 6
+app.config['HISTORY_PAGE_SIZE'] = 50        # history rows per endpoint details page
+app.config['SCHEDULER_ENABLED'] = True      # probe endpoints continuously in the background
+app.config['SCHEDULER_WORKERS'] = 8         # probes the scheduler may run at once
+app.config['SCHEDULER_REFRESH'] = 30        # seconds between re-reads of the endpoints table
+app.config['HISTORY_RETENTION_DAYS'] = 30   # raw history kept before compaction deletes it
+app.config['ROLLUP_RETENTION_DAYS'] = {60: 7, 3600: 90, 86400: None}  # per resolution; None keeps forever
+app.config['COMPACTION_BATCH_SIZE'] = 1000  # rows deleted per transaction
+app.config['COMPACTION_INTERVAL'] = 86400   # seconds between background compactions; 0 disables
+app.config['READ_POOL_SIZE'] = 8            # idle read-only connections kept for the web routes
+app.config['STATUS_POLL_INTERVAL'] = 2      # seconds between checks for results written by other processes
+app.config['STATUS_KEEPALIVE'] = 15         # seconds of silence before a keep-alive comment on /events/status
+app.config['STATUS_RETRY_MS'] = 3000        # how long browsers wait before reconnecting a dropped stream
+app.config['BREAKER_FAILURE_THRESHOLD'] = 3  # consecutive failures that open an endpoint's circuit
+app.config['BREAKER_BASE_BACKOFF'] = 30     # seconds an opened circuit waits before a trial probe
+app.config['BREAKER_MAX_BACKOFF'] = 900     # cap for the doubling backoff
+app.config['WORKER_BATCH_SIZE'] = 50        # endpoints a probe worker leases at a time
+app.config['WORKER_LEASE_SECONDS'] = 60     # a leased batch is reserved this long; must exceed a batch's probe time
+app.config['WORKER_POLL_INTERVAL'] = 1.0    # longest a probe worker sleeps between checks for due endpoints
+app.config['IMPORT_CHUNK_SIZE'] = 500       # endpoints inserted per transaction by bulk imports
+app.config['LOAD_TEST_USERS'] = 10          # default virtual users for `flask load-test`
+app.config['LOAD_TEST_RPS'] = 100           # default target requests per second
+app.config['LOAD_TEST_DURATION'] = 10       # default run length in seconds
 
 
 # --- Database Helper Functions ---
 
+# The database runs in WAL mode: readers never block the writer or each other.
+# Web routes read through a pool of read-only connections, and every write goes
+# through the single DatabaseWriter thread, which batches whatever is queued
+# into one transaction. That removes "database is locked" contention between
+# concurrent probes and the dashboard.
+
+def connect_db(readonly=False):
+    """Opens a connection with the pragmas every connection shares."""
+    if readonly:
+        uri = Path(app.config['DATABASE']).absolute().as_uri() + '?mode=ro'
+        db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        db.execute('PRAGMA query_only = ON')
+    else:
+        db = sqlite3.connect(app.config['DATABASE'])
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')  # fsync at checkpoints only; safe in WAL mode
+    db.execute('PRAGMA busy_timeout = 5000')
+    db.execute('PRAGMA cache_size = -16000')  # ~16 MB page cache
+    db.execute('PRAGMA temp_store = MEMORY')
+    db.execute('PRAGMA mmap_size = 134217728')
+    db.row_factory = sqlite3.Row
+    return db
+
+class ReadPool:
+    """Read-only connections reused across requests instead of reconnecting each time."""
+
+    def __init__(self, size):
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return connect_db(readonly=True)
+
+    def release(self, db):
+        if db.in_transaction:
+            db.rollback()
+        try:
+            self.idle.put_nowait(db)
+        except queue.Full:
+            db.close()
+
+read_pool = ReadPool(app.config['READ_POOL_SIZE'])
+
 def get_db():
-    """Establishes a connection to the SQLite database."""
+    """Borrows a read-only connection from the pool for the current app context."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(app.config['DATABASE'])
-        db.row_factory = sqlite3.Row
+        db = g._database = read_pool.acquire()
     return db
 
 @app.teardown_appcontext
 def close_connection(exception):
-    """Closes the database connection at the end of the request."""
-    db = getattr(g, '_database', None)
+    """Returns the read connection to the pool at the end of the request."""
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        read_pool.release(db)
+
+class DatabaseWriter:
+    """
+    The one thread that writes to the database.
+    Callers queue `fn(db, *args)` jobs and get a Future back. The writer drains
+    everything already queued (up to `batch_size` history rows) and applies it
+    in a single transaction, merging consecutive history inserts into one
+    insert_results call. Each job runs under its own SAVEPOINT, so a failing
+    job is rolled back and reported without losing the rest of the batch.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Applies everything queued so far, then stops the thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.queue.put((fn, args, future))
+        return future
+
+    def record(self, results):
+        return self.submit(insert_results, list(results))
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        rows = 0
+        while batch[-1] is not None and rows < self.batch_size:
+            fn, args, _ = batch[-1]
+            rows += len(args[0]) if fn is insert_results else 1
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        db = connect_db()
+        try:
+            while True:
+                batch = self._next_batch()
+                stopping = batch[-1] is None
+                jobs = batch[:-1] if stopping else batch
+                if jobs:
+                    self._apply(db, jobs)
+                if stopping:
+                    return
+        finally:
+            db.close()
+
+    def _apply(self, db, jobs):
+        groups = []
+        for fn, args, future in jobs:
+            if fn is insert_results and groups and groups[-1][0] is insert_results:
+                groups[-1][1][0].extend(args[0])
+                groups[-1][2].append(future)
+            else:
+                groups.append((fn, (list(args[0]),) if fn is insert_results else args, [future]))
+
+        outcomes = []
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            for fn, args, futures in groups:
+                db.execute('SAVEPOINT job')
+                try:
+                    outcomes.append((futures, True, fn(db, *args)))
+                except Exception as e:
+                    app.logger.exception('Database write %s failed', getattr(fn, '__name__', fn))
+                    db.execute('ROLLBACK TO job')
+                    outcomes.append((futures, False, e))
+                db.execute('RELEASE job')
+            db.commit()
+            committed = [
+                args[0] for (fn, args, _), (_, ok, _) in zip(groups, outcomes) if fn is insert_results and ok
+            ]
+            if committed:
+                status_stream.notify()
+                metrics.observe_write(sum(len(results) for results in committed))
+                for results in committed:
+                    metrics.observe_results(results)
+        except sqlite3.Error as e:
+            app.logger.exception('Database write batch failed')
+            if db.in_transaction:
+                db.rollback()
+            outcomes = [(futures, False, e) for _, _, futures in groups]
+
+        for futures, ok, value in outcomes:
+            for future in futures:
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+writer = None
+writer_lock = threading.Lock()
+
+def get_writer():
+    """Starts the writer thread on first use."""
+    global writer
+    if writer is None:
+        with writer_lock:
+            if writer is None:
+                writer = DatabaseWriter(app.config['HISTORY_BATCH_SIZE'])
+                writer.start()
+                atexit.register(writer.stop)
+    return writer
+
+def run_write(fn, *args):
+    """Runs `fn(db, *args)` on the writer thread and waits for it to commit."""
+    return get_writer().submit(fn, *args).result()
+
+# --- Response Body Store ---
+# Bodies are stored once per distinct payload in response_bodies, compressed and
+# keyed by the SHA-256 of the text. History rows only keep that hash.
+
+def compress_body(data):
+    """Returns (encoding, blob) for raw body bytes using the configured codec."""
+    level = app.config['BODY_COMPRESSION_LEVEL']
+    if app.config['BODY_COMPRESSION'] == 'zstd' and zstandard:
+        return 'zstd', zstandard.ZstdCompressor(level=level).compress(data)
+    return 'gzip', gzip.compress(data, compresslevel=level)
+
+def decompress_body(encoding, blob):
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('This response body is zstd-compressed; install the zstandard package to read it.')
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+def store_bodies(db, texts):
+    """
+    Stores each distinct body text that is not already in the store and
+    returns the hash for every input (None for empty bodies). Identical
+    payloads are hashed but never compressed or written twice.
+    """
+    encoded = [text.encode('utf-8') if text else None for text in texts]
+    hashes = [hashlib.sha256(data).hexdigest() if data else None for data in encoded]
+    pending = {digest: data for digest, data in zip(hashes, encoded) if digest}
+    if pending:
+        placeholders = ', '.join('?' * len(pending))
+        known = db.execute(f'SELECT hash FROM response_bodies WHERE hash IN ({placeholders})', list(pending))
+        for (digest,) in known:
+            del pending[digest]
+        rows = []
+        for digest, data in pending.items():
+            encoding, blob = compress_body(data)
+            rows.append((digest, encoding, len(data), blob))
+        db.executemany('INSERT OR IGNORE INTO response_bodies (hash, encoding, size, body) VALUES (?, ?, ?, ?)', rows)
+    return hashes
+
+def load_body(db, body_hash):
+    """Returns the decompressed text for a stored body hash, or None."""
+    row = db.execute('SELECT encoding, body FROM response_bodies WHERE hash = ?', (body_hash,)).fetchone()
+    if row is None:
+        return None
+    return decompress_body(row['encoding'], row['body']).decode('utf-8')
+
+def move_bodies_to_store(db, chunk_size=1000):
+    """Migration: moves inline history.response_body text into the content-addressed store."""
+    db.executescript('''
+    CREATE TABLE response_bodies (
+        hash TEXT PRIMARY KEY,
+        encoding TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        body BLOB NOT NULL
+    );
+    ALTER TABLE history ADD COLUMN body_hash TEXT;
+    ''')
+    last_id = 0
+    while True:
+        rows = db.execute(
+            "SELECT id, response_body FROM history WHERE id > ? AND response_body != '' ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        hashes = store_bodies(db, [row[1] for row in rows])
+        db.executemany('UPDATE history SET body_hash = ? WHERE id = ?', [(h, row[0]) for h, row in zip(hashes, rows)])
+        db.commit()
+        last_id = rows[-1][0]
+    db.execute('ALTER TABLE history DROP COLUMN response_body')
+
+# --- Latency Rollups ---
+# Every recorded probe is folded into per-endpoint buckets at minute, hour and
+# day resolution. Each bucket keeps probe/success counts for uptime and a
+# DDSketch of response times for percentiles, so stats never touch history.
+
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with a fixed relative accuracy (DDSketch).
+    Values fall into logarithmic bins, so every quantile is within
+    RELATIVE_ACCURACY of the true value and two sketches merge exactly by
+    adding bin counts - which is what lets minute buckets answer for any window.
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self, bins=None, zeros=0):
+        self.bins = bins or {}
+        self.zeros = zeros
+        self.count = zeros + sum(self.bins.values())
+
+    def add(self, value):
+        if value <= 0:
+            self.zeros += 1
+        else:
+            index = math.ceil(math.log(value) / self.LOG_GAMMA)
+            self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return 2 * self.GAMMA ** index / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.bins) / (self.GAMMA + 1)
+
+    def to_json(self):
+        return json.dumps({'zeros': self.zeros, 'bins': self.bins}, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls({int(index): count for index, count in data['bins'].items()}, data['zeros'])
+
+def update_rollups(db, results, now=None):
+    """
+    Folds probe results into their minute/hour/day buckets (read, merge, write).
+    Results may carry a `checked_ts` epoch; otherwise `now` is used.
+    Only probes that got a response contribute to the latency sketch.
+    """
+    now = time.time() if now is None else now
+    buckets = {}
+    for result in results:
+        checked_ts = result.get('checked_ts') or now
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (result['endpoint_id'], resolution, int(checked_ts // resolution * resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [0, 0, DDSketch()]
+            bucket[0] += 1
+            bucket[1] += bool(result['is_success'])
+            if result['status_code']:
+                bucket[2].add(result['response_time'])
+
+    for (endpoint_id, resolution, bucket_start), (probes, successes, sketch) in buckets.items():
+        row = db.execute(
+            'SELECT sketch FROM rollups WHERE endpoint_id = ? AND resolution = ? AND bucket_start = ?',
+            (endpoint_id, resolution, bucket_start)
+        ).fetchone()
+        if row:
+            sketch.merge(DDSketch.from_json(row[0]))
+        db.execute(
+            'INSERT INTO rollups (endpoint_id, resolution, bucket_start, probes, successes, sketch) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (endpoint_id, resolution, bucket_start) DO UPDATE SET '
+            'probes = probes + excluded.probes, successes = successes + excluded.successes, sketch = excluded.sketch',
+            (endpoint_id, resolution, bucket_start, probes, successes, sketch.to_json())
+        )
+
+def backfill_rollups(db, chunk_size=5000):
+    """Migration: creates the rollups table and folds existing history into it."""
+    db.executescript('''
+    CREATE TABLE rollups (
+        endpoint_id INTEGER NOT NULL,
+        resolution INTEGER NOT NULL,
+        bucket_start INTEGER NOT NULL,
+        probes INTEGER NOT NULL,
+        successes INTEGER NOT NULL,
+        sketch TEXT NOT NULL,
+        PRIMARY KEY (endpoint_id, resolution, bucket_start)
+    ) WITHOUT ROWID;
+    ''')
+    last_id = 0
+    while True:
+        rows = db.execute(
+            "SELECT id, endpoint_id, status_code, response_time, is_success, "
+            "CAST(strftime('%s', checked_at) AS INTEGER) AS checked_ts "
+            "FROM history WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        update_rollups(db, [dict(row) for row in rows])
+        db.commit()
+        last_id = rows[-1]['id']
+
+# Each entry upgrades an existing database by one schema version, tracked in
+# PRAGMA user_version. schema.sql always describes the latest version, so a
+# freshly initialized database starts at len(MIGRATIONS).
+MIGRATIONS = [
+    'ALTER TABLE endpoints ADD COLUMN interval_seconds INTEGER NOT NULL DEFAULT 60;',
+    '''
+    ALTER TABLE history ADD COLUMN dns_ms INTEGER;
+    ALTER TABLE history ADD COLUMN connect_ms INTEGER;
+    ALTER TABLE history ADD COLUMN tls_ms INTEGER;
+    ALTER TABLE history ADD COLUMN ttfb_ms INTEGER;
+    ALTER TABLE history ADD COLUMN reused_connection BOOLEAN;
+    ''',
+    '''
+    CREATE INDEX idx_history_endpoint_checked ON history (endpoint_id, checked_at DESC, id DESC);
+    CREATE INDEX idx_endpoints_name ON endpoints (name);
+    CREATE TABLE latest_status (
+        endpoint_id INTEGER PRIMARY KEY,
+        history_id INTEGER NOT NULL,
+        is_success BOOLEAN NOT NULL,
+        status_code INTEGER,
+        response_time INTEGER,
+        checked_at TIMESTAMP NOT NULL
+    );
+    INSERT INTO latest_status (endpoint_id, history_id, is_success, status_code, response_time, checked_at)
+    SELECT endpoint_id, id, is_success, status_code, response_time, checked_at FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY endpoint_id ORDER BY checked_at DESC, id DESC) AS rn
+        FROM history
+    ) WHERE rn = 1;
+    CREATE TRIGGER history_latest_status AFTER INSERT ON history BEGIN
+        INSERT INTO latest_status (endpoint_id, history_id, is_success, status_code, response_time, checked_at)
+        VALUES (NEW.endpoint_id, NEW.id, NEW.is_success, NEW.status_code, NEW.response_time, NEW.checked_at)
+        ON CONFLICT (endpoint_id) DO UPDATE SET
+            history_id = excluded.history_id, is_success = excluded.is_success, status_code = excluded.status_code,
+            response_time = excluded.response_time, checked_at = excluded.checked_at
+        WHERE excluded.checked_at >= latest_status.checked_at;
+    END;
+    ''',
+    move_bodies_to_store,
+    backfill_rollups,
+    'CREATE INDEX idx_history_body_hash ON history (body_hash);',
+    '''
+    CREATE TABLE load_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        endpoint_id INTEGER NOT NULL,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        users INTEGER NOT NULL,
+        target_rps REAL NOT NULL,
+        duration_s REAL NOT NULL,
+        requests INTEGER NOT NULL,
+        errors INTEGER NOT NULL,
+        error_rate REAL,
+        achieved_rps REAL,
+        mean_ms REAL,
+        p50_ms REAL,
+        p90_ms REAL,
+        p99_ms REAL,
+        p999_ms REAL,
+        max_ms REAL,
+        error_breakdown TEXT,
+        histogram TEXT,
+        FOREIGN KEY (endpoint_id) REFERENCES endpoints (id)
+    );
+    CREATE INDEX idx_load_runs_endpoint ON load_runs (endpoint_id, id DESC);
+    ''',
+    '''
+    ALTER TABLE endpoints ADD COLUMN assertions TEXT;
+    ALTER TABLE history ADD COLUMN failed_assertion TEXT;
+    ''',
+    '''
+    ALTER TABLE endpoints ADD COLUMN next_due_at REAL NOT NULL DEFAULT 0;
+    ALTER TABLE endpoints ADD COLUMN lease_owner TEXT;
+    ALTER TABLE endpoints ADD COLUMN lease_expires REAL;
+    CREATE INDEX idx_endpoints_due ON endpoints (next_due_at);
+    ALTER TABLE history ADD COLUMN probed_by TEXT;
+    ''',
+]
 
 def init_db():
     """Initializes the database using the schema.sql file."""
-    db = get_db()
+    # A plain connection: auto_vacuum in schema.sql only takes effect before
+    # anything (including the switch to WAL) has written the file header.
+    db = sqlite3.connect(app.config['DATABASE'])
     with app.open_resource('schema.sql', mode='r') as f:
         db.cursor().executescript(f.read())
+    db.execute(f'PRAGMA user_version = {len(MIGRATIONS)}')
     db.commit()
+    db.close()
+
+def migrate_db():
+    """Applies any pending MIGRATIONS and returns (old_version, new_version)."""
+    db = connect_db()
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        if callable(migration):
+            migration(db)
+        else:
+            db.executescript(migration)
+        db.execute(f'PRAGMA user_version = {number}')
+        db.commit()
+    db.close()
+    return version, len(MIGRATIONS)
 
 @app.cli.command('init-db')
 def init_db_command():
@@ -46,57 +561,1706 @@ def init_db_command():
         init_db()
     click.echo('Initialized the database.')
 
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Upgrades an existing database to the current schema without losing data."""
+    with app.app_context():
+        old_version, new_version = migrate_db()
+    if old_version == new_version:
+        click.echo(f'Database is already at schema version {new_version}.')
+    else:
+        click.echo(f'Migrated the database from schema version {old_version} to {new_version}.')
+
+# --- HTTP Sessions ---
+
+def http2_enabled():
+    """HTTP/2 is opt-in and silently skipped when the optional `h2` package is missing."""
+    if app.config['HTTP2'] and importlib.util.find_spec('h2') is None:
+        app.logger.warning('HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1.')
+        return False
+    return app.config['HTTP2']
+
+def probe_timeout():
+    """Overall timeout per probe, with a shorter connect timeout so unreachable hosts fail fast."""
+    return httpx.Timeout(app.config['PROBE_TIMEOUT'], connect=app.config['PROBE_CONNECT_TIMEOUT'])
+
+def http_limits(pool_size):
+    return httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=app.config['HTTP_KEEPALIVE_EXPIRY'],
+    )
+
+class SessionPool:
+    """
+    One keep-alive httpx.Client per scheme+host, shared by every probe.
+    Repeat probes of the same service reuse a warm TCP/TLS connection, so
+    `response_time` measures the API rather than the handshake.
+    """
+
+    def __init__(self):
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def client_for(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        client = self.clients.get(key)
+        if client is None:
+            with self.lock:
+                client = self.clients.get(key)
+                if client is None:
+                    client = self.clients[key] = httpx.Client(
+                        timeout=probe_timeout(),
+                        limits=http_limits(app.config['HTTP_POOL_SIZE']),
+                        http2=http2_enabled(),
+                    )
+        return client
+
+    def close(self):
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+
+http_sessions = SessionPool()
+atexit.register(http_sessions.close)
+
+class ProbeTimings:
+    """
+    Splits one request into DNS, connect, TLS and time-to-first-byte using
+    httpcore's trace extension. Pass `trace` (sync clients) or `atrace`
+    (async clients) as the request's `trace` extension.
+
+    httpcore resolves the host inside its TCP connect step, so the lookup is
+    timed on its own just before that step starts, bounded by the connect
+    timeout; httpcore's own lookup right after is normally answered from the
+    resolver's cache. It only happens when a new connection is opened. A
+    completed request that never opened a connection was served from the
+    keep-alive pool.
+    """
+
+    # getaddrinfo has no timeout of its own; sync lookups run here so they can be abandoned.
+    resolver = ThreadPoolExecutor(max_workers=8, thread_name_prefix='dns')
+
+    def __init__(self):
+        self.marks = {}
+        self.dns_ms = None
+
+    def _mark(self, event):
+        # Drop the 'connection.' / 'http11.' / 'http2.' prefix.
+        self.marks[event.split('.', 1)[1]] = time.perf_counter()
+
+    def trace(self, event, info):
+        if event == 'connection.connect_tcp.started':
+            start_time = time.perf_counter()
+            lookup = self.resolver.submit(socket.getaddrinfo, info['host'], info['port'], type=socket.SOCK_STREAM)
+            try:
+                lookup.result(timeout=info.get('timeout'))
+            except FutureTimeoutError:
+                raise httpcore.ConnectTimeout(f"DNS lookup of {info['host']} timed out")
+            except socket.gaierror as e:
+                raise httpcore.ConnectError(f'DNS lookup failed: {e}') from e
+            self.dns_ms = round((time.perf_counter() - start_time) * 1000)
+        self._mark(event)
+
+    async def atrace(self, event, info):
+        if event == 'connection.connect_tcp.started':
+            start_time = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    asyncio.get_running_loop().getaddrinfo(info['host'], info['port'], type=socket.SOCK_STREAM),
+                    info.get('timeout'),
+                )
+            except asyncio.TimeoutError:
+                raise httpcore.ConnectTimeout(f"DNS lookup of {info['host']} timed out")
+            except socket.gaierror as e:
+                raise httpcore.ConnectError(f'DNS lookup failed: {e}') from e
+            self.dns_ms = round((time.perf_counter() - start_time) * 1000)
+        self._mark(event)
+
+    def _span(self, start, end):
+        if start in self.marks and end in self.marks:
+            return round((self.marks[end] - self.marks[start]) * 1000)
+        return None
+
+    def columns(self):
+        return {
+            'dns_ms': self.dns_ms,
+            'connect_ms': self._span('connect_tcp.started', 'connect_tcp.complete'),
+            'tls_ms': self._span('start_tls.started', 'start_tls.complete'),
+            'ttfb_ms': self._span('send_request_headers.started', 'receive_response_headers.complete'),
+            # Only a request that got its response can tell; a failed one may never have reached the pool.
+            'reused_connection': 'connect_tcp.started' not in self.marks
+                                 if 'receive_response_headers.complete' in self.marks else None,
+        }
+
+NO_TIMINGS = {'dns_ms': None, 'connect_ms': None, 'tls_ms': None, 'ttfb_ms': None, 'reused_connection': None}
+
+# --- Response Assertions ---
+# Endpoints may carry a JSON list of assertions checked on every probe, e.g.
+#   [{"type": "jsonpath", "path": "$.data[0].status", "equals": "ok"},
+#    {"type": "regex", "pattern": "\"healthy\":\\s*true"},
+#    {"type": "header", "name": "X-Request-Id"},
+#    {"type": "latency", "max_ms": 500}]
+# They are validated and compiled when the endpoint is saved; compiled checks
+# are cached by their JSON text, so a probe only runs the precompiled tests and
+# the response body is parsed as JSON at most once, however many paths it checks.
+
+JSONPATH_STEP = re.compile(r"\.([A-Za-z_][\w-]*)|\[(-?\d+)\]|\[(['\"])(.*?)\3\]")
+MISSING = object()
+
+def compile_jsonpath(path):
+    """Compiles the `$.key[0]['other key']` subset of JSONPath into a tuple of lookup steps."""
+    if not path.startswith('$'):
+        raise ValueError(f"JSONPath '{path}' must start with '$'.")
+    steps, position = [], 1
+    while position < len(path):
+        match = JSONPATH_STEP.match(path, position)
+        if not match:
+            raise ValueError(f"Unsupported JSONPath '{path}' at position {position}.")
+        name, index, _, quoted = match.groups()
+        steps.append(int(index) if index is not None else (name if name is not None else quoted))
+        position = match.end()
+    return tuple(steps)
+
+def resolve_jsonpath(document, steps):
+    for step in steps:
+        try:
+            if isinstance(step, int) != isinstance(document, list):
+                return MISSING
+            document = document[step]
+        except (IndexError, KeyError, TypeError):
+            return MISSING
+    return document
+
+class ProbeResponse:
+    """What assertions see of a response. The JSON body is parsed on first use and then reused."""
+
+    def __init__(self, response, response_time):
+        self.response = response
+        self.response_time = response_time
+        self._json = None
+
+    @property
+    def json(self):
+        if self._json is None:
+            try:
+                self._json = self.response.json()
+            except ValueError:
+                self._json = MISSING
+        return self._json
+
+def compile_assertion(spec):
+    """Returns (label, test) for one assertion spec; `test` takes a ProbeResponse."""
+    if not isinstance(spec, dict):
+        raise ValueError('Each assertion must be a JSON object.')
+    kind = spec.get('type')
+    if kind == 'jsonpath':
+        steps = compile_jsonpath(str(spec.get('path', '')))
+        if 'equals' in spec:
+            expected = spec['equals']
+            return f"{spec['path']} == {json.dumps(expected)}", lambda r: resolve_jsonpath(r.json, steps) == expected
+        return f"{spec['path']} exists", lambda r: resolve_jsonpath(r.json, steps) is not MISSING
+    if kind == 'regex':
+        try:
+            pattern = re.compile(spec['pattern'])
+        except (KeyError, TypeError, re.error) as e:
+            raise ValueError(f'Invalid regex assertion: {e}')
+        return f'body matches /{pattern.pattern}/', lambda r: pattern.search(r.response.text) is not None
+    if kind == 'header':
+        name = spec.get('name')
+        if not name:
+            raise ValueError("Header assertions need a 'name'.")
+        if 'equals' in spec:
+            expected = str(spec['equals'])
+            return f'header {name} == {expected}', lambda r: r.response.headers.get(name) == expected
+        return f'header {name} present', lambda r: name in r.response.headers
+    if kind == 'latency':
+        max_ms = spec.get('max_ms')
+        if not isinstance(max_ms, (int, float)) or max_ms <= 0:
+            raise ValueError("Latency assertions need a positive 'max_ms'.")
+        return f'latency <= {max_ms:g}ms', lambda r: r.response_time <= max_ms
+    raise ValueError(f"Unknown assertion type '{kind}'. Use jsonpath, regex, header or latency.")
+
+@functools.lru_cache(maxsize=1024)
+def compile_assertions(text):
+    """Compiles an endpoint's `assertions` column. Raises ValueError for an invalid spec."""
+    if not text:
+        return ()
+    try:
+        specs = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f'Assertions are not valid JSON: {e}')
+    if not isinstance(specs, list):
+        raise ValueError('Assertions must be a JSON list.')
+    return tuple(compile_assertion(spec) for spec in specs)
+
+def failed_assertions(endpoint, response, response_time):
+    """Labels of the endpoint's assertions the response fails, joined with '; ', or None."""
+    checks = compile_assertions(endpoint['assertions'])
+    if not checks:
+        return None
+    probe = ProbeResponse(response, response_time)
+    failures = [label for label, test in checks if not test(probe)]
+    return '; '.join(failures) or None
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker for scheduled and bulk probes.
+
+    A circuit is closed while probes succeed. After FAILURE_THRESHOLD failures
+    in a row (transport errors or 5xx responses) it opens and probes are
+    skipped until a backoff expires; a refused connection or failed DNS lookup
+    opens it straight away. The backoff doubles each time the circuit re-opens,
+    up to a maximum, and is jittered so endpoints behind one dead host don't
+    come back in lockstep. When it expires the circuit is half-open: a single
+    trial probe is let through, which closes the circuit on success and
+    re-opens it on failure.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold, base_backoff, max_backoff, trial_timeout):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.trial_timeout = trial_timeout
+        self.circuits = {}  # endpoint_id -> state, failures, trips, retry_at; absent means closed
+        self.lock = threading.Lock()
+
+    def allow(self, endpoint_id):
+        """Whether a probe may run now. Moving to half-open admits exactly one trial."""
+        with self.lock:
+            circuit = self.circuits.get(endpoint_id)
+            if circuit is None or circuit['state'] == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if now < circuit['retry_at']:
+                return False
+            # A trial that never reports back frees the circuit again after trial_timeout.
+            circuit.update(state=self.HALF_OPEN, retry_at=now + self.trial_timeout)
+            return True
+
+    def record(self, endpoint_id, status_code, error=None):
+        """Feeds one probe outcome into the endpoint's circuit."""
+        failed = error is not None or status_code >= 500
+        with self.lock:
+            if not failed:
+                self.circuits.pop(endpoint_id, None)
+                return
+            circuit = self.circuits.setdefault(
+                endpoint_id, {'state': self.CLOSED, 'failures': 0, 'trips': 0, 'retry_at': 0.0}
+            )
+            circuit['failures'] += 1
+            if (circuit['state'] == self.HALF_OPEN or isinstance(error, httpx.ConnectError)
+                    or circuit['failures'] >= self.failure_threshold):
+                backoff = min(self.base_backoff * 2 ** circuit['trips'], self.max_backoff)
+                circuit.update(
+                    state=self.OPEN, trips=circuit['trips'] + 1,
+                    retry_at=time.monotonic() + random.uniform(backoff / 2, backoff)
+                )
+
+    def open_count(self):
+        with self.lock:
+            return sum(1 for circuit in self.circuits.values() if circuit['state'] != self.CLOSED)
+
+    def state(self, endpoint_id):
+        with self.lock:
+            circuit = self.circuits.get(endpoint_id)
+            if circuit is None:
+                return {'state': self.CLOSED, 'failures': 0, 'retry_in': None}
+            retry_in = max(circuit['retry_at'] - time.monotonic(), 0.0) if circuit['state'] == self.OPEN else None
+            return {
+                'state': circuit['state'],
+                'failures': circuit['failures'],
+                'retry_in': None if retry_in is None else round(retry_in, 1),
+            }
+
+circuit_breaker = CircuitBreaker(
+    app.config['BREAKER_FAILURE_THRESHOLD'], app.config['BREAKER_BASE_BACKOFF'],
+    app.config['BREAKER_MAX_BACKOFF'], app.config['PROBE_TIMEOUT'],
+)
+
 # --- Core Logic ---
 
-def run_api_test(endpoint_id):
+def build_request(endpoint):
+    """Returns the (method, url, headers, body) stored for an endpoint row."""
+    headers = json.loads(endpoint['headers']) if endpoint['headers'] else {}
+    body = json.loads(endpoint['body']) if endpoint['body'] else {}
+    return endpoint['method'], endpoint['url'], headers, body
+
+def make_result(endpoint, status_code=0, response_time=0, response_body="", error_message="", timings=None,
+                failed_assertion=None):
+    """Builds a history row for a finished probe."""
+    return {
+        'endpoint_id': endpoint['id'],
+        'status_code': status_code,
+        'response_time': response_time,
+        'response_body': response_body,
+        'is_success': status_code == endpoint['expected_status'] and not failed_assertion,
+        'error_message': error_message,
+        'failed_assertion': failed_assertion,
+        'probed_by': None,
+        **(timings.columns() if timings else NO_TIMINGS),
+    }
+
+def insert_results(db, results):
+    """
+    Writes probe results to history and folds them into the rollups.
+    Runs on the writer thread, inside the writer's transaction.
+    """
+    update_rollups(db, results)
+    hashes = store_bodies(db, [result['response_body'] for result in results])
+    rows = [dict(result, body_hash=body_hash) for result, body_hash in zip(results, hashes)]
+    db.executemany(
+        'INSERT INTO history (endpoint_id, status_code, response_time, body_hash, is_success, error_message, '
+        'failed_assertion, probed_by, dns_ms, connect_ms, tls_ms, ttfb_ms, reused_connection) '
+        'VALUES (:endpoint_id, :status_code, :response_time, :body_hash, :is_success, :error_message, '
+        ':failed_assertion, :probed_by, :dns_ms, :connect_ms, :tls_ms, :ttfb_ms, :reused_connection)',
+        rows
+    )
+
+def record_results(results):
+    """Queues probe results for the writer thread and waits until they are committed."""
+    get_writer().record(results).result()
+
+def run_api_test(endpoint_id, force=False):
     """
     Performs an HTTP request to a given endpoint and records the result.
     This function now operates within the app context to ensure DB commits work.
+    Returns None without probing if the endpoint is gone or its circuit is open,
+    unless `force` is set (a probe a user asked for).
     """
     with app.app_context():
         db = get_db()
         endpoint = db.execute('SELECT * FROM endpoints WHERE id = ?', (endpoint_id,)).fetchone()
 
-        if not endpoint:
+        if not endpoint or not (force or circuit_breaker.allow(endpoint_id)):
             return None
 
-        url, method = endpoint['url'], endpoint['method']
-        headers = json.loads(endpoint['headers']) if endpoint['headers'] else {}
-        body = json.loads(endpoint['body']) if endpoint['body'] else {}
-        
-        status_code, response_time, response_body, error_message, is_success = 0, 0, "", "", False
+        method, url, headers, body = build_request(endpoint)
+        timings = ProbeTimings()
 
         try:
-            start_time = time.time()
-            response = requests.request(method, url, json=body, headers=headers, timeout=10)
-            response_time = round((time.time() - start_time) * 1000)
-            status_code = response.status_code
-            response_body = response.text
-            is_success = (status_code == endpoint['expected_status'])
-        except requests.exceptions.RequestException as e:
-            error_message = str(e)
+            start_time = time.perf_counter()
+            with metrics.track_probe():
+                response = http_sessions.client_for(url).request(
+                    method, url, json=body, headers=headers, extensions={'trace': timings.trace}
+                )
+            response_time = round((time.perf_counter() - start_time) * 1000)
+            result = make_result(
+                endpoint, response.status_code, response_time, response.text, timings=timings,
+                failed_assertion=failed_assertions(endpoint, response, response_time)
+            )
+            circuit_breaker.record(endpoint_id, response.status_code)
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            result = make_result(endpoint, error_message=str(e) or type(e).__name__, timings=timings)
+            circuit_breaker.record(endpoint_id, 0, e)
 
-        db.execute(
-            'INSERT INTO history (endpoint_id, status_code, response_time, response_body, is_success, error_message) VALUES (?, ?, ?, ?, ?, ?)',
-            (endpoint_id, status_code, response_time, response_body, is_success, error_message)
-        )
-        db.commit()
+        record_results([result])
         return True
 
+# --- Concurrent Probe Engine ---
+
+async def probe_endpoint_async(client, endpoint, host_limits, in_flight):
+    """
+    Probes a single endpoint on the shared async client.
+    The per-host semaphore is taken before the global one so that a burst of
+    probes queued against one slow host never holds global in-flight slots.
+    """
+    method, url, headers, body = build_request(endpoint)
+    timings = ProbeTimings()
+    async with host_limits[urlsplit(url).netloc], in_flight:
+        try:
+            start_time = time.perf_counter()
+            with metrics.track_probe():
+                response = await client.request(
+                    method, url, json=body, headers=headers, extensions={'trace': timings.atrace}
+                )
+            response_time = round((time.perf_counter() - start_time) * 1000)
+            circuit_breaker.record(endpoint['id'], response.status_code)
+            return make_result(
+                endpoint, response.status_code, response_time, response.text, timings=timings,
+                failed_assertion=failed_assertions(endpoint, response, response_time)
+            )
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            circuit_breaker.record(endpoint['id'], 0, e)
+            return make_result(endpoint, error_message=str(e) or type(e).__name__, timings=timings)
+
+async def run_probes(endpoints, on_batch, max_in_flight=None, per_host_limit=None, batch_size=None):
+    """
+    Probes every endpoint concurrently and hands finished results to
+    `on_batch` in groups of `batch_size` as they complete.
+    Returns the total number of probes that met their expected status.
+    """
+    max_in_flight = max_in_flight or app.config['PROBE_MAX_IN_FLIGHT']
+    per_host_limit = per_host_limit or app.config['PROBE_PER_HOST_LIMIT']
+    batch_size = batch_size or app.config['HISTORY_BATCH_SIZE']
+
+    in_flight = asyncio.Semaphore(max_in_flight)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(per_host_limit))
+    successes, batch = 0, []
+
+    async with httpx.AsyncClient(
+        timeout=probe_timeout(), limits=http_limits(max_in_flight), http2=http2_enabled()
+    ) as client:
+        tasks = [asyncio.create_task(probe_endpoint_async(client, e, host_limits, in_flight)) for e in endpoints]
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            successes += result['is_success']
+            batch.append(result)
+            if len(batch) >= batch_size:
+                on_batch(batch)
+                batch = []
+    if batch:
+        on_batch(batch)
+    return successes
+
+def run_all_endpoints(**limits):
+    """
+    Runs one concurrent sweep over every row in `endpoints`, skipping those
+    whose circuit is open. Must be called inside an app context.
+    Returns (probed, succeeded, skipped).
+    """
+    rows = get_db().execute('SELECT * FROM endpoints').fetchall()
+    endpoints = [endpoint for endpoint in rows if circuit_breaker.allow(endpoint['id'])]
+    writes = []
+    successes = asyncio.run(run_probes(endpoints, lambda batch: writes.append(get_writer().record(batch)), **limits))
+    for write in writes:
+        write.result()
+    return len(endpoints), successes, len(rows) - len(endpoints)
+
+@app.cli.command('run-all')
+@click.option('--max-in-flight', type=int, default=None, help='Global limit on concurrent probes.')
+@click.option('--per-host', type=int, default=None, help='Concurrent probes allowed against one host.')
+@click.option('--batch-size', type=int, default=None, help='History rows written per transaction.')
+def run_all_command(max_in_flight, per_host, batch_size):
+    """Probes every endpoint concurrently and records the results."""
+    with app.app_context():
+        start_time = time.perf_counter()
+        total, successes, skipped = run_all_endpoints(
+            max_in_flight=max_in_flight, per_host_limit=per_host, batch_size=batch_size
+        )
+        elapsed = time.perf_counter() - start_time
+    click.echo(f'Probed {total} endpoints in {elapsed:.2f}s ({successes} succeeded, {total - successes} failed).')
+    if skipped:
+        click.echo(f'Skipped {skipped} endpoints with an open circuit.')
+
+# --- Load Testing ---
+# Replays an endpoint's stored request from N virtual users at a target rate.
+# Requests follow a fixed open-loop schedule (request k is due at k / rps), and
+# latency is measured from that scheduled time rather than from when a user
+# got round to sending it, so a stalled server shows up as latency instead of
+# quietly lowering the request rate (coordinated omission).
+
+class HdrHistogram:
+    """
+    High-dynamic-range latency histogram, in microseconds.
+    Values below SUB_BUCKETS are counted exactly; above that each power of two
+    is split into SUB_BUCKETS / 2 linear steps, so every recorded value is
+    kept to within ~0.8% (two significant figures) from microseconds to minutes.
+    """
+
+    SUB_BUCKET_BITS = 8
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF = SUB_BUCKETS // 2
+
+    def __init__(self, counts=None):
+        self.counts = counts or {}
+        self.count = sum(self.counts.values())
+        self.total = sum(self._value(index) * n for index, n in self.counts.items())
+
+    def _index(self, value):
+        if value < self.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        return self.SUB_BUCKETS + (shift - 1) * self.HALF + (value >> shift) - self.HALF
+
+    def _value(self, index):
+        """Midpoint of the value range a bucket index covers."""
+        if index < self.SUB_BUCKETS:
+            return index
+        shift, sub = divmod(index - self.SUB_BUCKETS, self.HALF)
+        shift += 1
+        return ((sub + self.HALF) << shift) + (1 << shift) // 2
+
+    def record(self, value):
+        value = max(int(value), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+
+    def merge(self, other):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        return self
+
+    def value_at_percentile(self, percentile):
+        if not self.count:
+            return None
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return self._value(index)
+        return self._value(max(self.counts))
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_json(self):
+        return json.dumps(self.counts, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        return cls({int(index): n for index, n in json.loads(text).items()})
+
+async def virtual_user(client, endpoint, user, users, rps, started, deadline, histogram, errors):
+    """One virtual user: sends every `users`-th request of the shared schedule."""
+    method, url, headers, body = build_request(endpoint)
+    loop = asyncio.get_running_loop()
+    sequence = user
+    while True:
+        due = started + sequence / rps
+        if due >= deadline:
+            return
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            response = await client.request(method, url, json=body, headers=headers)
+            if response.status_code != endpoint['expected_status']:
+                errors[f'HTTP {response.status_code}'] += 1
+            else:
+                failed = failed_assertions(endpoint, response, (loop.time() - due) * 1000)
+                if failed:
+                    errors[f'Assertion {failed}'] += 1
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            errors[type(e).__name__] += 1
+        histogram.record((loop.time() - due) * 1_000_000)
+        sequence += users
+
+async def run_load(endpoint, users, rps, duration):
+    """Runs `users` virtual users against one endpoint and returns the load run summary."""
+    histogram, errors = HdrHistogram(), defaultdict(int)
+    async with httpx.AsyncClient(
+        timeout=probe_timeout(), limits=http_limits(users), http2=http2_enabled()
+    ) as client:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + duration
+        await asyncio.gather(*(
+            virtual_user(client, endpoint, user, users, rps, started, deadline, histogram, errors)
+            for user in range(users)
+        ))
+        elapsed = loop.time() - started
+
+    def ms(value):
+        return None if value is None else round(value / 1000, 2)
+
+    error_count = sum(errors.values())
+    return {
+        'endpoint_id': endpoint['id'],
+        'users': users,
+        'target_rps': rps,
+        'duration_s': round(elapsed, 3),
+        'requests': histogram.count,
+        'errors': error_count,
+        'error_rate': round(error_count / histogram.count, 4) if histogram.count else None,
+        'achieved_rps': round(histogram.count / elapsed, 1) if elapsed else None,
+        'mean_ms': ms(histogram.mean()),
+        'p50_ms': ms(histogram.value_at_percentile(50)),
+        'p90_ms': ms(histogram.value_at_percentile(90)),
+        'p99_ms': ms(histogram.value_at_percentile(99)),
+        'p999_ms': ms(histogram.value_at_percentile(99.9)),
+        'max_ms': ms(histogram.value_at_percentile(100)),
+        'error_breakdown': json.dumps(errors),
+        'histogram': histogram.to_json(),
+    }
+
+def save_load_run(db, run):
+    return db.execute(
+        'INSERT INTO load_runs (endpoint_id, users, target_rps, duration_s, requests, errors, error_rate, '
+        'achieved_rps, mean_ms, p50_ms, p90_ms, p99_ms, p999_ms, max_ms, error_breakdown, histogram) '
+        'VALUES (:endpoint_id, :users, :target_rps, :duration_s, :requests, :errors, :error_rate, '
+        ':achieved_rps, :mean_ms, :p50_ms, :p90_ms, :p99_ms, :p999_ms, :max_ms, :error_breakdown, :histogram)',
+        run
+    ).lastrowid
+
+def run_load_test(endpoint_id, users=None, rps=None, duration=None):
+    """Load-tests one endpoint and stores the summary in `load_runs`. Returns the summary, or None."""
+    with app.app_context():
+        endpoint = get_db().execute('SELECT * FROM endpoints WHERE id = ?', (endpoint_id,)).fetchone()
+    if not endpoint:
+        return None
+    run = asyncio.run(run_load(
+        endpoint,
+        users or app.config['LOAD_TEST_USERS'],
+        rps or app.config['LOAD_TEST_RPS'],
+        duration or app.config['LOAD_TEST_DURATION'],
+    ))
+    run['id'] = run_write(save_load_run, run)
+    return run
+
+@app.cli.command('load-test')
+@click.argument('endpoint_id', type=int)
+@click.option('--users', type=click.IntRange(min=1), default=None, help='Concurrent virtual users.')
+@click.option('--rps', type=click.FloatRange(min=0, min_open=True), default=None, help='Target requests per second across all users.')
+@click.option('--duration', type=click.FloatRange(min=0, min_open=True), default=None, help='Length of the run in seconds.')
+def load_test_command(endpoint_id, users, rps, duration):
+    """Load-tests one endpoint with its stored request and records the run."""
+    run = run_load_test(endpoint_id, users, rps, duration)
+    if run is None:
+        raise click.ClickException(f'No endpoint with id {endpoint_id}.')
+    click.echo(
+        f"{run['requests']} requests in {run['duration_s']}s "
+        f"({run['achieved_rps']} req/s of {run['target_rps']:g} target, {run['users']} users)"
+    )
+    click.echo(
+        f"latency ms: mean {run['mean_ms']}  p50 {run['p50_ms']}  p90 {run['p90_ms']}  "
+        f"p99 {run['p99_ms']}  p99.9 {run['p999_ms']}  max {run['max_ms']}"
+    )
+    click.echo(f"errors: {run['errors']} ({(run['error_rate'] or 0):.2%}) {run['error_breakdown']}")
+
+# --- Background Scheduler ---
+
+class ProbeScheduler:
+    """
+    Probes every endpoint once per `interval_seconds` without a human in the loop.
+
+    Due times live in a heap of (due_at, endpoint_id) pairs, so the scheduler
+    thread only ever wakes for the next probe that is due. Each endpoint's
+    first run is offset by a golden-ratio fraction of its interval, which
+    spreads endpoints sharing an interval evenly instead of firing them all on
+    the same second. Probes run on a bounded thread pool; when every worker is
+    busy the due probe is pushed back briefly rather than queued without limit.
+
+    Before probing, the scheduler leases the endpoint in the database just like a
+    `flask probe-worker` does, and afterwards stores the endpoint's next due time.
+    An endpoint that a worker is probing, or has already probed this interval,
+    is skipped, so the dashboard and workers never check the same endpoint twice.
+    """
+
+    PHASE_STEP = 0.6180339887  # golden ratio conjugate
+    RETRY_DELAY = 1.0          # seconds to wait for a free worker
+    DUE_SLACK = 0.05           # seconds early a probe may lease an endpoint, absorbing clock conversion
+
+    def __init__(self, workers, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self.queue = []
+        self.intervals = {}
+        self.running = set()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(workers)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='probe')
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name='probe-scheduler', daemon=True)
+        self.owner = f'{socket.gethostname()}:{os.getpid()}/scheduler'
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.pool.shutdown(wait=True)
+
+    def refresh(self):
+        """Re-reads endpoint intervals, scheduling new endpoints and forgetting deleted ones."""
+        with app.app_context():
+            rows = get_db().execute('SELECT id, interval_seconds FROM endpoints').fetchall()
+        now = time.monotonic()
+        intervals = {row['id']: max(row['interval_seconds'] or 1, 1) for row in rows}
+        for endpoint_id, interval in intervals.items():
+            if endpoint_id not in self.intervals:
+                phase = (endpoint_id * self.PHASE_STEP) % 1.0
+                heapq.heappush(self.queue, (now + phase * interval, endpoint_id))
+        # Entries for deleted endpoints stay in the heap and are dropped when popped.
+        self.intervals = intervals
+
+    def due_count(self):
+        now = time.monotonic()
+        return sum(1 for due_at, _ in list(self.queue) if due_at <= now)
+
+    def _dispatch_due(self, now):
+        while self.queue and self.queue[0][0] <= now:
+            due_at, endpoint_id = heapq.heappop(self.queue)
+            interval = self.intervals.get(endpoint_id)
+            if interval is None:
+                continue
+            if not self.slots.acquire(blocking=False):
+                heapq.heappush(self.queue, (now + self.RETRY_DELAY, endpoint_id))
+                return
+            # Keep the endpoint's phase unless we have fallen a whole interval behind.
+            next_due = due_at + interval
+            next_due = next_due if next_due > now else now + interval
+            heapq.heappush(self.queue, (next_due, endpoint_id))
+            with self.lock:
+                if endpoint_id in self.running:
+                    self.slots.release()
+                    continue
+                self.running.add(endpoint_id)
+            # The database keeps wall-clock due times, shared with the probe workers.
+            self.pool.submit(self._probe, endpoint_id, now - due_at, time.time() + (next_due - now))
+
+    def _probe(self, endpoint_id, lag, next_due_at):
+        try:
+            if not run_write(lease_endpoint, self.owner, endpoint_id, app.config['WORKER_LEASE_SECONDS'], self.DUE_SLACK):
+                return
+            metrics.observe_lag(lag)
+            try:
+                run_api_test(endpoint_id)
+            finally:
+                run_write(finish_lease, self.owner, endpoint_id, next_due_at)
+        except Exception:
+            app.logger.exception('Scheduled probe of endpoint %s failed', endpoint_id)
+        finally:
+            with self.lock:
+                self.running.discard(endpoint_id)
+            self.slots.release()
+
+    def _loop(self):
+        next_refresh = 0.0
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_refresh:
+                try:
+                    self.refresh()
+                except sqlite3.Error:
+                    app.logger.exception('Could not read endpoints for scheduling')
+                next_refresh = now + self.refresh_interval
+            self._dispatch_due(now)
+            wake_at = min(self.queue[0][0], next_refresh) if self.queue else next_refresh
+            self.stop_event.wait(max(wake_at - time.monotonic(), 0.05))
+
+scheduler = None
+scheduler_lock = threading.Lock()
+
+def start_scheduler():
+    """Starts the background probe scheduler once per process."""
+    global scheduler
+    with scheduler_lock:
+        if scheduler is None:
+            scheduler = ProbeScheduler(app.config['SCHEDULER_WORKERS'], app.config['SCHEDULER_REFRESH'])
+            scheduler.start()
+    return scheduler
+
+@app.cli.command('scheduler')
+def scheduler_command():
+    """Runs the probe scheduler in the foreground, without the web dashboard."""
+    start_scheduler()
+    if app.config['COMPACTION_INTERVAL']:
+        start_compactor()
+    click.echo('Probe scheduler running. Press Ctrl+C to stop.')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+# --- Probe Workers ---
+# `flask probe-worker` processes share the probing load through the database.
+# Each endpoint row carries its next due time and a lease. A worker leases a
+# batch of due, unleased endpoints inside one write transaction (SQLite runs
+# write transactions one at a time, so two workers can never lease the same
+# row), probes them concurrently, then records the results and pushes each
+# endpoint's next due time forward in a second transaction. A worker that dies
+# mid-batch simply lets its leases expire, and the endpoints become due again.
+# The dashboard's own scheduler leases each endpoint the same way before probing
+# it, so it can keep running next to workers without duplicating their checks.
+
+def lease_due_endpoints(db, worker_id, limit, lease_seconds, now=None):
+    """Leases up to `limit` due endpoints to `worker_id` and returns their rows."""
+    now = time.time() if now is None else now
+    ids = [row[0] for row in db.execute(
+        'SELECT id FROM endpoints WHERE next_due_at <= ? AND (lease_expires IS NULL OR lease_expires < ?) '
+        'ORDER BY next_due_at LIMIT ?',
+        (now, now, limit)
+    )]
+    if not ids:
+        return []
+    placeholders = ', '.join('?' * len(ids))
+    db.execute(
+        f'UPDATE endpoints SET lease_owner = ?, lease_expires = ? WHERE id IN ({placeholders})',
+        [worker_id, now + lease_seconds, *ids]
+    )
+    return db.execute(f'SELECT * FROM endpoints WHERE id IN ({placeholders})', ids).fetchall()
+
+def complete_leases(db, worker_id, endpoint_ids, results, now=None):
+    """Records a leased batch's results and releases the leases, scheduling each endpoint's next probe."""
+    now = time.time() if now is None else now
+    if results:
+        insert_results(db, results)
+    db.executemany(
+        'UPDATE endpoints SET next_due_at = ? + interval_seconds, lease_owner = NULL, lease_expires = NULL '
+        'WHERE id = ? AND lease_owner = ?',
+        [(now, endpoint_id, worker_id) for endpoint_id in endpoint_ids]
+    )
+
+def lease_endpoint(db, owner, endpoint_id, lease_seconds, slack=0.0, now=None):
+    """Leases one endpoint if it is due (within `slack` seconds) and unleased; returns whether it did."""
+    now = time.time() if now is None else now
+    cursor = db.execute(
+        'UPDATE endpoints SET lease_owner = ?, lease_expires = ? '
+        'WHERE id = ? AND next_due_at <= ? AND (lease_expires IS NULL OR lease_expires < ?)',
+        (owner, now + lease_seconds, endpoint_id, now + slack, now)
+    )
+    return cursor.rowcount == 1
+
+def finish_lease(db, owner, endpoint_id, next_due_at):
+    """Releases a single-endpoint lease and stores when the endpoint is next due."""
+    db.execute(
+        'UPDATE endpoints SET next_due_at = ?, lease_owner = NULL, lease_expires = NULL '
+        'WHERE id = ? AND lease_owner = ?',
+        (next_due_at, endpoint_id, owner)
+    )
+
+def release_leases(db, worker_id):
+    db.execute(
+        'UPDATE endpoints SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?', (worker_id,)
+    )
+
+def next_due_in(db, now=None):
+    """Seconds until the next endpoint falls due, or None if there are none."""
+    now = time.time() if now is None else now
+    due_at = db.execute('SELECT MIN(next_due_at) FROM endpoints').fetchone()[0]
+    return None if due_at is None else max(due_at - now, 0.0)
+
+def run_probe_worker(worker_id, batch_size=None, lease_seconds=None, poll_interval=None, stop_event=None):
+    """Leases, probes and reports batches of due endpoints until `stop_event` is set."""
+    batch_size = batch_size or app.config['WORKER_BATCH_SIZE']
+    lease_seconds = lease_seconds or app.config['WORKER_LEASE_SECONDS']
+    poll_interval = poll_interval or app.config['WORKER_POLL_INTERVAL']
+    stop_event = stop_event or threading.Event()
+    try:
+        while not stop_event.is_set():
+            leased = run_write(lease_due_endpoints, worker_id, batch_size, lease_seconds)
+            if not leased:
+                with app.app_context():
+                    wait = next_due_in(get_db())
+                stop_event.wait(poll_interval if wait is None else min(max(wait, 0.05), poll_interval))
+                continue
+
+            now = time.time()
+            for endpoint in leased:
+                if endpoint['next_due_at']:
+                    metrics.observe_lag(now - endpoint['next_due_at'])
+            endpoints = [endpoint for endpoint in leased if circuit_breaker.allow(endpoint['id'])]
+            results = []
+            asyncio.run(run_probes(endpoints, results.extend, batch_size=batch_size))
+            for result in results:
+                result['probed_by'] = worker_id
+            run_write(complete_leases, worker_id, [endpoint['id'] for endpoint in leased], results)
+            if results:
+                metrics.observe_write(len(results))
+                metrics.observe_results(results)
+    finally:
+        run_write(release_leases, worker_id)
+
+def probe_worker_process(worker_id, batch_size, lease_seconds, poll_interval, metrics_port=None):
+    """Entry point of a worker child process started by `flask probe-worker --processes`."""
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    try:
+        run_probe_worker(worker_id, batch_size, lease_seconds, poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('probe-worker')
+@click.option('--worker-id', default=None, help='Name recorded with each probe; defaults to host:pid.')
+@click.option('--processes', type=int, default=1, help='Worker processes to start on this machine.')
+@click.option('--batch-size', type=int, default=None, help='Endpoints leased per batch.')
+@click.option('--lease-seconds', type=int, default=None, help='How long a leased batch stays reserved.')
+@click.option('--poll-interval', type=float, default=None, help='Longest wait between checks for due endpoints.')
+@click.option('--metrics-port', type=int, default=None,
+              help='Serve /metrics on this port; with --processes, worker N uses port + N - 1.')
+def probe_worker_command(worker_id, processes, batch_size, lease_seconds, poll_interval, metrics_port):
+    """Probes due endpoints, sharing the work with every other running worker."""
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    if processes <= 1:
+        click.echo(f'Probe worker {worker_id} running. Press Ctrl+C to stop.')
+        probe_worker_process(worker_id, batch_size, lease_seconds, poll_interval, metrics_port)
+        return
+
+    # Children are forked before this process starts any threads of its own.
+    children = [
+        multiprocessing.Process(
+            target=probe_worker_process, name=f'{worker_id}/{number}',
+            args=(
+                f'{worker_id}/{number}', batch_size, lease_seconds, poll_interval,
+                metrics_port + number - 1 if metrics_port else None,
+            ),
+        )
+        for number in range(1, processes + 1)
+    ]
+    for child in children:
+        child.start()
+    click.echo(f'Started {processes} probe workers ({worker_id}/1..{processes}). Press Ctrl+C to stop.')
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.join()
+
+# --- History Retention ---
+
+def delete_in_batches(query, params, batch_size, pause=0.05):
+    """
+    Repeats a `DELETE ... LIMIT`-style statement as separate small writer jobs,
+    pausing between batches so queued probe results are never held up behind
+    a long delete. Returns the number of rows deleted.
+    """
+    deleted = 0
+    while True:
+        count = run_write(lambda db: db.execute(query, [*params, batch_size]).rowcount)
+        deleted += count
+        if count < batch_size:
+            return deleted
+        time.sleep(pause)
+
+def incremental_vacuum(db):
+    """Releases free pages back to the filesystem; returns the count, or None if not enabled."""
+    if db.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:  # INCREMENTAL
+        return None
+    free_pages = db.execute('PRAGMA freelist_count').fetchone()[0]
+    db.execute('PRAGMA incremental_vacuum').fetchall()  # steps until every free page is released
+    return free_pages - db.execute('PRAGMA freelist_count').fetchone()[0]
+
+def compact_history(retention_days=None, batch_size=None):
+    """
+    Applies the retention policy. Raw history older than the retention window
+    is deleted; it is already summarized in the rollups, which are written as
+    each probe is recorded. Rollups are downsampled in turn (minute buckets
+    expire first, hour and day buckets cover the same span), orphaned response
+    bodies are dropped, and freed pages are returned with an incremental VACUUM.
+    """
+    if retention_days is None:
+        retention_days = app.config['HISTORY_RETENTION_DAYS']
+    batch_size = batch_size or app.config['COMPACTION_BATCH_SIZE']
+    stats = {}
+
+    # Oldest rows have the lowest ids, so walking rowid order finds each batch immediately.
+    stats['history'] = delete_in_batches(
+        "DELETE FROM history WHERE id IN ("
+        "SELECT id FROM history WHERE checked_at < datetime('now', ?) ORDER BY id LIMIT ?)",
+        [f'-{retention_days} days'], batch_size
+    )
+
+    stats['rollups'] = 0
+    for resolution, days in app.config['ROLLUP_RETENTION_DAYS'].items():
+        if days is None:
+            continue
+        stats['rollups'] += delete_in_batches(
+            'DELETE FROM rollups WHERE (endpoint_id, resolution, bucket_start) IN ('
+            'SELECT endpoint_id, resolution, bucket_start FROM rollups '
+            'WHERE resolution = ? AND bucket_start < ? LIMIT ?)',
+            [resolution, int(time.time()) - days * 86400], batch_size
+        )
+
+    stats['bodies'] = delete_in_batches(
+        'DELETE FROM response_bodies WHERE hash IN ('
+        'SELECT hash FROM response_bodies r WHERE NOT EXISTS '
+        '(SELECT 1 FROM history h WHERE h.body_hash = r.hash) LIMIT ?)',
+        [], batch_size
+    )
+
+    stats['pages_freed'] = run_write(incremental_vacuum)
+    return stats
+
+class Compactor:
+    """Runs compact_history every COMPACTION_INTERVAL seconds on a daemon thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name='history-compactor', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                stats = compact_history()
+                app.logger.info('Compacted history: %s', stats)
+            except sqlite3.Error:
+                app.logger.exception('History compaction failed')
+
+compactor = None
+
+def start_compactor():
+    """Starts the background compaction task once per process."""
+    global compactor
+    with scheduler_lock:
+        if compactor is None:
+            compactor = Compactor(app.config['COMPACTION_INTERVAL'])
+            compactor.start()
+    return compactor
+
+@app.before_request
+def ensure_background_tasks():
+    """Starts the background tasks lazily when served by `flask run` or a WSGI server."""
+    if app.config['SCHEDULER_ENABLED'] and scheduler is None:
+        start_scheduler()
+    if app.config['COMPACTION_INTERVAL'] and compactor is None:
+        start_compactor()
+
+@app.cli.command('compact-history')
+@click.option('--days', type=int, default=None, help='Keep raw history for this many days.')
+@click.option('--batch-size', type=int, default=None, help='Rows deleted per transaction.')
+@click.option('--enable-incremental-vacuum', is_flag=True,
+              help='One-time full VACUUM that switches an older database to incremental auto-vacuum.')
+def compact_history_command(days, batch_size, enable_incremental_vacuum):
+    """Deletes expired history, downsamples rollups and reclaims free space."""
+    if enable_incremental_vacuum:
+        # VACUUM cannot run inside the writer's transaction, so it gets its own connection.
+        db = connect_db()
+        db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        db.execute('VACUUM')
+        db.close()
+    stats = compact_history(days, batch_size)
+    click.echo(
+        f"Deleted {stats['history']} history rows, {stats['rollups']} expired rollup buckets "
+        f"and {stats['bodies']} unreferenced response bodies."
+    )
+    if stats['pages_freed'] is None:
+        click.echo('Incremental VACUUM is not enabled for this database; run once with --enable-incremental-vacuum.')
+    else:
+        click.echo(f"Incremental VACUUM freed {stats['pages_freed']} pages.")
+
+# --- Live Status Stream ---
+# Open dashboards subscribe to /events/status (server-sent events). A single
+# watcher thread per process reads latest_status rows newer than the last one
+# it has seen and fans the same pre-encoded event out to every subscriber, so
+# N dashboards cost one small query per change instead of N page reloads.
+# The writer thread wakes the watcher after each committed batch of results;
+# the poll interval only matters for probes recorded by other processes.
+
+class StatusStream:
+    """Fans latest_status changes out to every connected dashboard."""
+
+    def __init__(self, poll_interval, queue_size=100):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name='status-stream', daemon=True)
+                self.thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        with self.lock:
+            return subscriber in self.subscribers
+
+    def notify(self):
+        """Tells the watcher new results were committed."""
+        self.wake.set()
+
+    def _loop(self):
+        with app.app_context():
+            last_id = get_db().execute('SELECT COALESCE(MAX(history_id), 0) FROM latest_status').fetchone()[0]
+        while True:
+            self.wake.wait(self.poll_interval)
+            self.wake.clear()
+            with self.lock:
+                if not self.subscribers:
+                    continue
+            try:
+                with app.app_context():
+                    rows = status_changes(get_db(), last_id)
+            except sqlite3.Error:
+                app.logger.exception('Reading status changes failed')
+                continue
+            if not rows:
+                continue
+            last_id = max(row['history_id'] for row in rows)
+            self._publish(status_event(rows, last_id))
+
+    def _publish(self, event):
+        with self.lock:
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    # A stalled client; dropping it ends its stream, and the
+                    # browser reconnects with Last-Event-ID to catch up.
+                    self.subscribers.discard(subscriber)
+
+status_stream = StatusStream(app.config['STATUS_POLL_INTERVAL'])
+
+def status_changes(db, after_history_id):
+    """latest_status rows written since `after_history_id`."""
+    return db.execute(
+        'SELECT endpoint_id, history_id, is_success, status_code, response_time, checked_at '
+        'FROM latest_status WHERE history_id > ?',
+        (after_history_id,)
+    ).fetchall()
+
+def status_event(rows, last_id):
+    """Encodes status rows as one SSE `status` event, tagged with the newest history id."""
+    data = json.dumps([
+        {
+            'endpoint_id': row['endpoint_id'],
+            'is_success': None if row['is_success'] is None else bool(row['is_success']),
+            'status_code': row['status_code'],
+            'response_time': row['response_time'],
+            'checked_at': row['checked_at'],
+        }
+        for row in rows
+    ], separators=(',', ':'))
+    return f'id: {last_id}\nevent: status\ndata: {data}\n\n'
+
+@app.route('/events/status')
+def status_events():
+    """Streams status deltas to the dashboard as server-sent events."""
+    subscriber = status_stream.subscribe()
+    backlog = ''
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        rows = status_changes(get_db(), int(last_event_id))
+        if rows:
+            backlog = status_event(rows, max(row['history_id'] for row in rows))
+
+    def stream():
+        try:
+            yield f"retry: {app.config['STATUS_RETRY_MS']}\n\n{backlog}"
+            while True:
+                try:
+                    yield subscriber.get(timeout=app.config['STATUS_KEEPALIVE'])
+                except queue.Empty:
+                    if not status_stream.is_subscribed(subscriber):
+                        return
+                    yield ': keepalive\n\n'
+        finally:
+            status_stream.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # keep nginx from buffering the stream
+    })
+
+# --- Bulk Import / Export ---
+# Endpoints move between environments as JSON Lines, one endpoint per line,
+# with the same fields as the endpoints table. Imports also accept HAR
+# captures and OpenAPI specs. Rows are validated one at a time while the input
+# is read and written with executemany in chunks of IMPORT_CHUNK_SIZE, one
+# writer transaction per chunk; exports stream straight off a database cursor.
+
+ENDPOINT_FIELDS = ('name', 'url', 'method', 'headers', 'body', 'expected_status', 'interval_seconds', 'assertions')
+ENDPOINT_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'PATCH')
+# Headers a browser or HTTP client sets itself; replaying them from a HAR breaks requests.
+HAR_SKIPPED_HEADERS = {'host', 'content-length', 'connection', 'cookie', 'accept-encoding'}
+
+def as_json_text(value, default):
+    """Stores dicts/lists as JSON text; strings are assumed to already be JSON and are checked."""
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        json.loads(value)
+        return value
+    return json.dumps(value)
+
+def validate_endpoint(record):
+    """Normalizes one imported record into an endpoints row, or raises ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError('expected a JSON object')
+    name, url = record.get('name'), record.get('url')
+    if not name or not url:
+        raise ValueError("'name' and 'url' are required")
+    if urlsplit(url).scheme not in ('http', 'https'):
+        raise ValueError(f"unsupported URL '{url}'")
+    method = str(record.get('method') or 'GET').upper()
+    if method not in ENDPOINT_METHODS:
+        raise ValueError(f"unsupported method '{method}'")
+    try:
+        row = {
+            'name': str(name),
+            'url': url,
+            'method': method,
+            'headers': as_json_text(record.get('headers'), '{}'),
+            'body': as_json_text(record.get('body'), '{}'),
+            'expected_status': int(record.get('expected_status') or 200),
+            'interval_seconds': max(int(record.get('interval_seconds') or 60), 1),
+            'assertions': as_json_text(record.get('assertions'), None),
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'invalid field: {e}')
+    compile_assertions(row['assertions'])
+    return row
+
+def read_jsonl(stream):
+    """Yields one record per non-blank line."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f'invalid JSON: {e}')
+
+IMPORT_WARNING = '_import_warning'  # key a reader sets on a record it could only partly import
+
+def read_har(stream):
+    """
+    Yields a record per request captured in a HAR file (a single JSON document).
+    Raises ValueError if the document is not a HAR log; malformed entries are yielded as ValueError.
+    """
+    har = json.load(stream)
+    log = har.get('log') if isinstance(har, dict) else None
+    entries = log.get('entries', []) if isinstance(log, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError("not a HAR file: expected an object with a 'log.entries' list")
+    for entry in entries:
+        req = entry.get('request') if isinstance(entry, dict) else None
+        if not isinstance(req, dict) or not isinstance(req.get('url', ''), str):
+            yield ValueError('HAR entry without a request object and URL')
+            continue
+        raw_headers = req.get('headers') or []
+        if not isinstance(raw_headers, list) or not all(
+            isinstance(h, dict) and isinstance(h.get('name'), str) and 'value' in h for h in raw_headers
+        ):
+            yield ValueError('HAR request headers must be objects with a name and a value')
+            continue
+        parts = urlsplit(req.get('url', ''))
+        headers = {
+            h['name']: h['value'] for h in raw_headers
+            if not h['name'].startswith(':') and h['name'].lower() not in HAR_SKIPPED_HEADERS
+        }
+        post_data = req.get('postData')
+        body = (post_data.get('text') if isinstance(post_data, dict) else None) or None
+        warning = None
+        if isinstance(body, str):
+            try:
+                json.loads(body)
+            except ValueError:
+                # Probes send JSON bodies only; form-encoded or plain-text bodies are left out.
+                mime = post_data.get('mimeType') or 'non-JSON'
+                body, warning = None, f'imported without its {mime} request body'
+        response = entry.get('response')
+        status = response.get('status') if isinstance(response, dict) else None
+        status = status if isinstance(status, int) else None
+        record = {
+            'name': f"{req.get('method', 'GET')} {parts.netloc}{parts.path}",
+            'url': req.get('url'),
+            'method': req.get('method'),
+            'headers': headers,
+            'body': body,
+            'expected_status': status if status and 100 <= status < 600 else 200,
+        }
+        if warning:
+            record[IMPORT_WARNING] = warning
+        yield record
+
+def read_openapi(stream, base_url=None):
+    """Yields a record per operation in an OpenAPI 3 or Swagger 2 spec (JSON, or YAML with PyYAML installed)."""
+    text = stream.read()
+    try:
+        spec = json.loads(text)
+    except ValueError:
+        if yaml is None:
+            raise ValueError('spec is not JSON; install PyYAML to import YAML specs')
+        spec = yaml.safe_load(text)
+    if not isinstance(spec, dict):
+        raise ValueError('spec must be an OpenAPI or Swagger object')
+    if not base_url:
+        servers = spec.get('servers')
+        if isinstance(servers, list) and servers and isinstance(servers[0], dict):
+            base_url = servers[0].get('url', '')
+        elif isinstance(spec.get('host'), str):
+            schemes = spec.get('schemes') if isinstance(spec.get('schemes'), list) else None
+            base_url = f"{(schemes or ['https'])[0]}://{spec['host']}{spec.get('basePath') or ''}"
+    if not base_url or not isinstance(base_url, str):
+        raise ValueError('spec has no server URL; pass a base URL')
+    base_url = base_url.rstrip('/')
+    paths = spec.get('paths') or {}
+    if not isinstance(paths, dict):
+        raise ValueError("spec 'paths' must be an object")
+
+    for path, operations in paths.items():
+        path = str(path)
+        if not isinstance(operations, dict):
+            yield ValueError(f'{path}: path item must be an object')
+            continue
+        shared = operations.get('parameters') or []
+        for method, op in operations.items():
+            method = str(method)
+            if method.upper() not in ENDPOINT_METHODS:
+                continue
+            own = (op.get('parameters') or []) if isinstance(op, dict) else None
+            if not isinstance(shared, list) or not isinstance(own, list):
+                yield ValueError(f'{method.upper()} {path}: operation and its parameters must be objects and lists')
+                continue
+            url = base_url + path
+            for param in shared + own:
+                if isinstance(param, dict) and param.get('in') == 'path' and isinstance(param.get('name'), str):
+                    schema = param.get('schema') if isinstance(param.get('schema'), dict) else {}
+                    value = param.get('example', schema.get('example'))
+                    if value is not None:
+                        url = url.replace('{' + param['name'] + '}', str(value))
+            if '{' in url:
+                yield ValueError(f'{method.upper()} {path}: path parameter without an example')
+                continue
+            responses = op.get('responses') if isinstance(op.get('responses'), dict) else {}
+            codes = sorted(int(code) for code in responses if str(code).isdigit())
+            request_body = op.get('requestBody') if isinstance(op.get('requestBody'), dict) else {}
+            content = request_body.get('content') if isinstance(request_body.get('content'), dict) else {}
+            body = None
+            for media in content.values():
+                if isinstance(media, dict) and 'example' in media:
+                    body = media['example']
+                    break
+            yield {
+                'name': op.get('operationId') or op.get('summary') or f'{method.upper()} {path}',
+                'url': url,
+                'method': method.upper(),
+                'body': body,
+                'expected_status': next((code for code in codes if 200 <= code < 300), codes[0] if codes else 200),
+            }
+
+IMPORT_READERS = {'jsonl': read_jsonl, 'har': read_har, 'openapi': read_openapi}
+
+def detect_import_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.har'):
+        return 'har'
+    if name.endswith(('.yaml', '.yml')) or 'openapi' in name or 'swagger' in name:
+        return 'openapi'
+    return 'jsonl'
+
+def insert_endpoints(db, rows):
+    db.executemany(
+        'INSERT INTO endpoints (' + ', '.join(ENDPOINT_FIELDS) + ') '
+        'VALUES (' + ', '.join(':' + field for field in ENDPOINT_FIELDS) + ')',
+        rows
+    )
+
+def import_endpoints(records, chunk_size=None):
+    """
+    Validates records as they arrive and inserts them in chunks.
+    `records` may yield ValueError instances for entries a reader could not parse.
+    Returns {'imported': n, 'errors': ['record 3: ...', ...], 'warnings': [...]}.
+    """
+    chunk_size = chunk_size or app.config['IMPORT_CHUNK_SIZE']
+    imported, errors, warnings, chunk = 0, [], [], []
+    for number, record in enumerate(records, start=1):
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            if isinstance(record, dict) and IMPORT_WARNING in record:
+                warnings.append(f'record {number}: {record.pop(IMPORT_WARNING)}')
+            chunk.append(validate_endpoint(record))
+        except ValueError as e:
+            errors.append(f'record {number}: {e}')
+            continue
+        if len(chunk) >= chunk_size:
+            run_write(insert_endpoints, chunk)
+            imported += len(chunk)
+            chunk = []
+    if chunk:
+        run_write(insert_endpoints, chunk)
+        imported += len(chunk)
+    return {'imported': imported, 'errors': errors, 'warnings': warnings}
+
+def export_endpoints():
+    """Yields every endpoint as a JSON line, streamed from a pooled read connection."""
+    db = read_pool.acquire()
+    try:
+        cursor = db.execute('SELECT ' + ', '.join(ENDPOINT_FIELDS) + ' FROM endpoints ORDER BY id')
+        for row in cursor:
+            record = dict(row)
+            for field in ('headers', 'body', 'assertions'):
+                if record[field]:
+                    record[field] = json.loads(record[field])
+            yield json.dumps(record) + '\n'
+    finally:
+        read_pool.release(db)
+
+@app.cli.command('import-endpoints')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(sorted(IMPORT_READERS)), default=None,
+              help='Input format; guessed from the file name by default.')
+@click.option('--base-url', default=None, help='Server URL for OpenAPI specs without one.')
+@click.option('--chunk-size', type=int, default=None, help='Endpoints inserted per transaction.')
+def import_endpoints_command(source, fmt, base_url, chunk_size):
+    """Bulk-imports endpoints from JSONL, a HAR capture or an OpenAPI spec."""
+    fmt = fmt or detect_import_format(source.name)
+    records = read_openapi(source, base_url) if fmt == 'openapi' else IMPORT_READERS[fmt](source)
+    try:
+        result = import_endpoints(records, chunk_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for warning in result['warnings']:
+        click.echo(f'Warning: {warning}', err=True)
+    for error in result['errors']:
+        click.echo(f'Skipped {error}', err=True)
+    click.echo(f"Imported {result['imported']} endpoints ({len(result['errors'])} skipped).")
+
+@app.cli.command('export-endpoints')
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+def export_endpoints_command(target):
+    """Writes every endpoint as JSON Lines (to stdout by default)."""
+    for line in export_endpoints():
+        target.write(line)
+
+@app.route('/api/endpoints/import', methods=['POST'])
+def import_endpoints_api():
+    """Bulk import from the raw request body; ?format=jsonl (default), har or openapi."""
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in IMPORT_READERS:
+        return jsonify(error=f"Unknown format '{fmt}'. Use jsonl, har or openapi."), 400
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+    if fmt == 'openapi':
+        records = read_openapi(stream, request.args.get('base_url'))
+    else:
+        records = IMPORT_READERS[fmt](stream)
+    try:
+        result = import_endpoints(records)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(result), 201 if result['imported'] else 200
+
+@app.route('/api/endpoints/export')
+def export_endpoints_api():
+    """Streams every endpoint as JSON Lines."""
+    return Response(export_endpoints(), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': 'attachment; filename=endpoints.jsonl',
+    })
+
+# --- Metrics ---
+# /metrics serves Prometheus text format from counters kept in memory: probe
+# results are folded in by the writer thread as they are committed, so a scrape
+# never queries the database (apart from priming the last known status of each
+# endpoint once after start-up). Every process keeps its own numbers; probe
+# workers can serve theirs with `flask probe-worker --metrics-port`.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)  # rows
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0)  # seconds
+
+class Histogram:
+    """Fixed-bucket histogram rendered as a Prometheus histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def render(self, name, labels=''):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {self.count}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum:g}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+    """In-memory probe results and internal gauges for the /metrics endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}  # endpoint_id -> {'up', 'latency', 'probes', 'failures', 'histogram'}
+        self.names = {}
+        self.primed = False
+        self.in_flight = 0
+        self.write_batches = Histogram(BATCH_BUCKETS)
+        self.probe_lag = Histogram(LAG_BUCKETS)
+
+    def _endpoint(self, endpoint_id):
+        state = self.endpoints.get(endpoint_id)
+        if state is None:
+            state = self.endpoints[endpoint_id] = {
+                'up': None, 'latency': None, 'probes': 0, 'failures': 0, 'histogram': Histogram(LATENCY_BUCKETS),
+            }
+        return state
+
+    def observe_write(self, rows):
+        with self.lock:
+            self.write_batches.observe(rows)
+
+    def observe_results(self, results):
+        """Folds committed probe results in; called by the writer thread."""
+        with self.lock:
+            for result in results:
+                state = self._endpoint(result['endpoint_id'])
+                state['up'] = bool(result['is_success'])
+                state['probes'] += 1
+                state['failures'] += not result['is_success']
+                if result['status_code']:
+                    state['latency'] = result['response_time'] / 1000
+                    state['histogram'].observe(result['response_time'] / 1000)
+
+    def observe_lag(self, seconds):
+        with self.lock:
+            self.probe_lag.observe(max(seconds, 0.0))
+
+    def forget(self, endpoint_id):
+        with self.lock:
+            self.endpoints.pop(endpoint_id, None)
+            self.names.pop(endpoint_id, None)
+
+    @contextlib.contextmanager
+    def track_probe(self):
+        with self.lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def _load_names(self):
+        """Primes last known statuses once, then looks up names only for endpoints not seen before."""
+        db = read_pool.acquire()
+        try:
+            if not self.primed:
+                for row in db.execute('SELECT endpoint_id, is_success, status_code, response_time FROM latest_status'):
+                    with self.lock:
+                        state = self._endpoint(row['endpoint_id'])
+                        if state['up'] is None:
+                            state['up'] = bool(row['is_success'])
+                            state['latency'] = row['response_time'] / 1000 if row['status_code'] else None
+                self.primed = True
+            with self.lock:
+                missing = [endpoint_id for endpoint_id in self.endpoints if endpoint_id not in self.names]
+            if missing:
+                placeholders = ', '.join('?' * len(missing))
+                rows = db.execute(f'SELECT id, name FROM endpoints WHERE id IN ({placeholders})', missing).fetchall()
+                with self.lock:
+                    self.names.update((row['id'], row['name']) for row in rows)
+                    for endpoint_id in set(missing) - {row['id'] for row in rows}:
+                        self.endpoints.pop(endpoint_id, None)  # deleted since it was probed
+        finally:
+            read_pool.release(db)
+
+    def render(self):
+        try:
+            self._load_names()
+        except sqlite3.Error:
+            app.logger.exception('Could not read endpoint names for /metrics')
+
+        lines = []
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            labels = {
+                endpoint_id: f'endpoint_id="{endpoint_id}",name="{label_value(self.names.get(endpoint_id, ""))}"'
+                for endpoint_id, _ in endpoints
+            }
+            family('apimon_endpoint_up', 'gauge', 'Whether the last probe of the endpoint succeeded (1) or failed (0).')
+            lines += [f'apimon_endpoint_up{{{labels[i]}}} {int(s["up"])}' for i, s in endpoints if s['up'] is not None]
+            family('apimon_endpoint_last_latency_seconds', 'gauge', 'Response time of the last probe that got a response.')
+            lines += [
+                f'apimon_endpoint_last_latency_seconds{{{labels[i]}}} {s["latency"]:g}'
+                for i, s in endpoints if s['latency'] is not None
+            ]
+            family('apimon_endpoint_probes_total', 'counter', 'Probes recorded by this process.')
+            lines += [f'apimon_endpoint_probes_total{{{labels[i]}}} {s["probes"]}' for i, s in endpoints]
+            family('apimon_endpoint_failures_total', 'counter', 'Failed probes recorded by this process.')
+            lines += [f'apimon_endpoint_failures_total{{{labels[i]}}} {s["failures"]}' for i, s in endpoints]
+            family('apimon_endpoint_latency_seconds', 'histogram', 'Response times of probes recorded by this process.')
+            for endpoint_id, state in endpoints:
+                lines += state['histogram'].render('apimon_endpoint_latency_seconds', labels[endpoint_id])
+
+            family('apimon_probes_in_flight', 'gauge', 'Probes currently waiting on a response.')
+            lines.append(f'apimon_probes_in_flight {self.in_flight}')
+            family('apimon_db_write_batch_rows', 'histogram', 'History rows committed per writer transaction.')
+            lines += self.write_batches.render('apimon_db_write_batch_rows')
+            family('apimon_probe_lag_seconds', 'histogram', 'How late probes started relative to their due time.')
+            lines += self.probe_lag.render('apimon_probe_lag_seconds')
+
+        family('apimon_scheduler_queue_depth', 'gauge', 'Scheduled probes that are due but not yet started.')
+        lines.append(f'apimon_scheduler_queue_depth {scheduler.due_count() if scheduler else 0}')
+        family('apimon_db_writer_queue_depth', 'gauge', 'Write jobs waiting for the database writer thread.')
+        lines.append(f'apimon_db_writer_queue_depth {writer.queue.qsize() if writer else 0}')
+        family('apimon_circuits_open', 'gauge', 'Endpoints whose circuit breaker is open or half-open.')
+        lines.append(f'apimon_circuits_open {circuit_breaker.open_count()}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def start_metrics_server(port):
+    """Serves /metrics from a background thread, for processes without the web app (probe workers)."""
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            with app.app_context():
+                body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
 # --- Web Page Routes ---
 
 @app.route('/')
 def dashboard():
     db = get_db()
+    # latest_status holds one row per endpoint and is kept current by a trigger on
+    # history, so this stays O(endpoints) no matter how much history piles up.
     query = """
     SELECT 
         e.id, e.name, e.url, e.method,
-        h.is_success, h.status_code, h.response_time, h.checked_at
+        l.is_success, l.status_code, l.response_time, l.checked_at
     FROM endpoints e
-    LEFT JOIN (
-        SELECT *, ROW_NUMBER() OVER(PARTITION BY endpoint_id ORDER BY checked_at DESC) as rn
-        FROM history
-    ) h ON e.id = h.endpoint_id AND h.rn = 1
+    LEFT JOIN latest_status l ON l.endpoint_id = e.id
     ORDER BY e.name;
     """
     endpoints = db.execute(query).fetchall()
@@ -105,46 +2269,190 @@ def dashboard():
 @app.route('/endpoint/add', methods=['GET', 'POST'])
 def add_endpoint():
     if request.method == 'POST':
-        db = get_db()
-        db.execute(
-            'INSERT INTO endpoints (name, url, method, headers, body, expected_status) VALUES (?, ?, ?, ?, ?, ?)',
-            [
-                request.form['name'], request.form['url'], request.form['method'],
-                request.form['headers'] or '{}', request.form['body'] or '{}',
-                int(request.form['expected_status'])
-            ]
-        )
-        db.commit()
+        assertions = request.form.get('assertions', '').strip() or None
+        try:
+            compile_assertions(assertions)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return render_template('add_endpoint.html', form=request.form)
+        values = [
+            request.form['name'], request.form['url'], request.form['method'],
+            request.form['headers'] or '{}', request.form['body'] or '{}',
+            int(request.form['expected_status']), max(int(request.form.get('interval_seconds') or 60), 1),
+            assertions
+        ]
+        run_write(lambda db: db.execute(
+            'INSERT INTO endpoints (name, url, method, headers, body, expected_status, interval_seconds, assertions) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            values
+        ))
         flash(f"Endpoint '{request.form['name']}' was successfully added.", 'success')
         return redirect(url_for('dashboard'))
     return render_template('add_endpoint.html')
 
+class HistoryPage:
+    """
+    One page of an endpoint's history, streamed straight off the database cursor.
+    Pages are addressed by a keyset cursor on (checked_at, id), so an old page is
+    a seek into idx_history_endpoint_checked instead of an OFFSET scan.
+    The query runs when the template starts iterating, i.e. inside the streamed
+    response's context, and `next_cursor` is set once iteration reaches a row
+    past the end of the page.
+    """
+
+    def __init__(self, query, params, page_size):
+        self.query = query
+        self.params = params
+        self.page_size = page_size
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        rows = get_db().execute(self.query, self.params + [self.page_size + 1])
+        for count, row in enumerate(rows, start=1):
+            if count > self.page_size:
+                self.next_cursor = f"{last['checked_at']},{last['id']}"
+                break
+            last = row
+            yield row
+
 @app.route('/endpoint/<int:endpoint_id>')
 def endpoint_details(endpoint_id):
     db = get_db()
     endpoint = db.execute('SELECT * FROM endpoints WHERE id = ?', (endpoint_id,)).fetchone()
     if not endpoint: abort(404)
-    history = db.execute('SELECT * FROM history WHERE endpoint_id = ? ORDER BY checked_at DESC', (endpoint_id,)).fetchall()
-    return render_template('endpoint_details.html', endpoint=endpoint, history=history)
+
+    cursor = request.args.get('before')
+    keyset, params = '', [endpoint_id]
+    if cursor:
+        checked_at, _, history_id = cursor.rpartition(',')
+        if not checked_at or not history_id.isdigit(): abort(400)
+        keyset = 'AND (checked_at, id) < (?, ?) '
+        params += [checked_at, int(history_id)]
+
+    # Bodies stay in response_bodies until someone opens one (see history_body).
+    query = (
+        'SELECT id, status_code, response_time, body_hash, is_success, error_message, failed_assertion, '
+        'probed_by, checked_at, dns_ms, connect_ms, tls_ms, ttfb_ms, reused_connection '
+        'FROM history WHERE endpoint_id = ? ' + keyset +
+        'ORDER BY checked_at DESC, id DESC LIMIT ?'
+    )
+    history = HistoryPage(query, params, app.config['HISTORY_PAGE_SIZE'])
+    return stream_template('endpoint_details.html', endpoint=endpoint, history=history, cursor=cursor)
+
+@app.route('/history/<int:history_id>/body')
+def history_body(history_id):
+    db = get_db()
+    row = db.execute('SELECT body_hash FROM history WHERE id = ?', (history_id,)).fetchone()
+    if not row or not row['body_hash']: abort(404)
+    body = load_body(db, row['body_hash'])
+    if body is None: abort(404)
+    return app.response_class(body, mimetype='text/plain')
 
 @app.route('/endpoint/test/<int:endpoint_id>', methods=['POST'])
 def test_endpoint(endpoint_id):
-    run_api_test(endpoint_id)
+    run_api_test(endpoint_id, force=True)
     flash('API test has been executed. See the result below.', 'info')
     return redirect(url_for('endpoint_details', endpoint_id=endpoint_id))
 
 @app.route('/endpoint/delete/<int:endpoint_id>', methods=['POST'])
 def delete_endpoint(endpoint_id):
-    db = get_db()
-    db.execute('DELETE FROM history WHERE endpoint_id = ?', (endpoint_id,))
-    db.execute('DELETE FROM endpoints WHERE id = ?', (endpoint_id,))
-    db.commit()
+    def delete(db):
+        db.execute('DELETE FROM history WHERE endpoint_id = ?', (endpoint_id,))
+        db.execute('DELETE FROM latest_status WHERE endpoint_id = ?', (endpoint_id,))
+        db.execute('DELETE FROM rollups WHERE endpoint_id = ?', (endpoint_id,))
+        db.execute('DELETE FROM load_runs WHERE endpoint_id = ?', (endpoint_id,))
+        db.execute('DELETE FROM endpoints WHERE id = ?', (endpoint_id,))
+    run_write(delete)
+    metrics.forget(endpoint_id)
     flash('Endpoint and its history have been deleted.', 'success')
     return redirect(url_for('dashboard'))
     
+# --- JSON API ---
+
+WINDOW_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+def parse_window(text):
+    """Parses a window such as '15m', '24h' or '7d' into seconds, or returns None."""
+    unit, amount = text[-1:], text[:-1]
+    if unit not in WINDOW_UNITS or not amount.isdigit() or int(amount) <= 0:
+        return None
+    return int(amount) * WINDOW_UNITS[unit]
+
+def rollup_resolution(window_seconds):
+    """Picks the coarsest resolution that still gives a useful series (a few hundred buckets at most)."""
+    if window_seconds <= 6 * 3600:
+        return 60
+    if window_seconds <= 14 * 86400:
+        return 3600
+    return 86400
+
+def summarize(probes, successes, sketch):
+    return {
+        'probes': probes,
+        'uptime_pct': round(100.0 * successes / probes, 3) if probes else None,
+        'p50': round(sketch.quantile(0.50), 1) if sketch.count else None,
+        'p95': round(sketch.quantile(0.95), 1) if sketch.count else None,
+        'p99': round(sketch.quantile(0.99), 1) if sketch.count else None,
+    }
+
+@app.route('/api/endpoint/<int:endpoint_id>/stats')
+def endpoint_stats(endpoint_id):
+    """Uptime and p50/p95/p99 latency for a window, answered entirely from rollups."""
+    window = request.args.get('window', '24h')
+    window_seconds = parse_window(window)
+    if window_seconds is None:
+        return jsonify(error=f"Invalid window '{window}'. Use a number followed by m, h or d, e.g. 24h."), 400
+
+    db = get_db()
+    if not db.execute('SELECT 1 FROM endpoints WHERE id = ?', (endpoint_id,)).fetchone():
+        return jsonify(error='Endpoint not found.'), 404
+
+    resolution = rollup_resolution(window_seconds)
+    since = int((time.time() - window_seconds) // resolution * resolution)
+    rows = db.execute(
+        'SELECT bucket_start, probes, successes, sketch FROM rollups '
+        'WHERE endpoint_id = ? AND resolution = ? AND bucket_start >= ? ORDER BY bucket_start',
+        (endpoint_id, resolution, since)
+    ).fetchall()
+
+    total, series = [0, 0, DDSketch()], []
+    for row in rows:
+        sketch = DDSketch.from_json(row['sketch'])
+        series.append({'bucket_start': row['bucket_start'], **summarize(row['probes'], row['successes'], sketch)})
+        total[0] += row['probes']
+        total[1] += row['successes']
+        total[2].merge(sketch)
+
+    return jsonify(
+        endpoint_id=endpoint_id, window=window, resolution=resolution,
+        **summarize(*total), circuit=circuit_breaker.state(endpoint_id), series=series
+    )
+
+@app.route('/api/endpoint/<int:endpoint_id>/load-runs')
+def endpoint_load_runs(endpoint_id):
+    """The most recent load test summaries for an endpoint, newest first."""
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    rows = get_db().execute(
+        'SELECT * FROM load_runs WHERE endpoint_id = ? ORDER BY id DESC LIMIT ?', (endpoint_id, limit)
+    ).fetchall()
+    runs = []
+    for row in rows:
+        run = dict(row)
+        del run['histogram']
+        run['error_breakdown'] = json.loads(run['error_breakdown'] or '{}')
+        runs.append(run)
+    return jsonify(endpoint_id=endpoint_id, load_runs=runs)
+
 @app.errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
 
 if __name__ == '__main__':
+    # With the reloader active, only the child process (WERKZEUG_RUN_MAIN) serves the app.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if app.config['SCHEDULER_ENABLED']:
+            start_scheduler()
+        if app.config['COMPACTION_INTERVAL']:
+            start_compactor()
     app.run(debug=True)
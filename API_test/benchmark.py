@@ -0,0 +1,350 @@
+# benchmark.py
+# Reproducible benchmarks for the probe and storage pipeline.
+#
+#   python benchmark.py --sizes 10k,1m --output results.json
+#   python benchmark.py --sizes 10k --compare results.json
+#
+# Every scenario runs in a fresh child process against its own database, with
+# a local stub HTTP server standing in for the monitored APIs. Results are
+# written as JSON (with the git commit, Python and SQLite versions) so runs on
+# different commits can be compared with --compare.
+
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import sqlite3
+import platform
+import statistics
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import click
+
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+SEED = 1234
+
+# --- Stub HTTP Server ---
+
+STUB_RESPONSE = (
+    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 27\r\n\r\n'
+    b'{"status":"ok","items":[1]}'
+)
+
+async def handle_stub_connection(reader, writer):
+    """Answers every request on a keep-alive connection with the same small JSON body."""
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    await reader.readexactly(int(line.split(b':', 1)[1]))
+            writer.write(STUB_RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+def serve_stub(port):
+    async def main():
+        server = await asyncio.start_server(handle_stub_connection, '127.0.0.1', port)
+        await server.serve_forever()
+    asyncio.run(main())
+
+def start_stub_server():
+    """Starts the stub server in its own process and returns (process, port)."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = multiprocessing.Process(target=serve_stub, args=(port,), daemon=True)
+    process.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('stub server did not start')
+
+# --- Synthetic History ---
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+def open_app(database):
+    """Imports the app configured for a benchmark database, with background tasks off."""
+    from app import app
+    app.config['DATABASE'] = database
+    app.config['SCHEDULER_ENABLED'] = False
+    app.config['COMPACTION_INTERVAL'] = 0
+    return app
+
+def generate_history(database, rows, endpoints=100, days=30, stub_port=9):
+    """
+    Creates a database with `endpoints` endpoints and `rows` history rows spread
+    evenly over the last `days` days. Rows are generated inside SQLite with a
+    recursive CTE, one million per transaction, with the latest_status trigger
+    dropped during the load and the table rebuilt once at the end. Rollups are
+    filled in for the last day only, which is what the stats benchmark reads.
+    """
+    import app as monitor
+    open_app(database)
+    if os.path.exists(database):
+        os.remove(database)
+    monitor.init_db()
+
+    db = sqlite3.connect(database)
+    db.executemany(
+        'INSERT INTO endpoints (name, url, method, headers, body, expected_status, interval_seconds) '
+        "VALUES (?, ?, 'GET', '{}', '{}', 200, 60)",
+        [(f'service-{n:04d}', f'http://127.0.0.1:{stub_port}/service/{n}') for n in range(endpoints)]
+    )
+    hashes = monitor.store_bodies(db, [json.dumps({'status': 'ok', 'page': n}) for n in range(20)])
+    db.execute('CREATE TEMP TABLE bodies (n INTEGER PRIMARY KEY, hash TEXT)')
+    db.executemany('INSERT INTO bodies VALUES (?, ?)', enumerate(hashes))
+
+    trigger = db.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'history_latest_status'"
+    ).fetchone()[0]
+    db.execute('DROP TRIGGER history_latest_status')
+    now, spacing = time.time(), days * 86400 / max(rows, 1)
+    chunk = 1_000_000
+    for start in range(0, rows, chunk):
+        count = min(chunk, rows - start)
+        db.execute(
+            'WITH RECURSIVE seq(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM seq WHERE i < ?) '
+            'INSERT INTO history (endpoint_id, status_code, response_time, body_hash, is_success, checked_at) '
+            'SELECT i % ? + 1, CASE WHEN i % 50 = 0 THEN 503 ELSE 200 END, 20 + abs(random() % 400), '
+            '(SELECT hash FROM bodies WHERE n = i % 20), i % 50 != 0, '
+            "datetime(? - (? - i) * ?, 'unixepoch') FROM seq",
+            (start, start + count - 1, endpoints, now, rows, spacing)
+        )
+        db.commit()
+    db.execute('DELETE FROM latest_status')
+    db.execute(
+        'INSERT INTO latest_status (endpoint_id, history_id, is_success, status_code, response_time, checked_at) '
+        'SELECT h.endpoint_id, h.id, h.is_success, h.status_code, h.response_time, h.checked_at '
+        'FROM endpoints e JOIN history h ON h.id = ('
+        'SELECT id FROM history WHERE endpoint_id = e.id ORDER BY checked_at DESC, id DESC LIMIT 1)'
+    )
+    db.execute(trigger)
+    db.commit()
+
+    recent = db.execute(
+        "SELECT endpoint_id, status_code, response_time, is_success, "
+        "CAST(strftime('%s', checked_at) AS INTEGER) AS checked_ts FROM history "
+        "WHERE checked_at >= datetime('now', '-1 day')"
+    )
+    columns = [column[0] for column in recent.description]
+    db.execute('BEGIN')
+    while True:
+        batch = [dict(zip(columns, row)) for row in recent.fetchmany(50_000)]
+        if not batch:
+            break
+        monitor.update_rollups(db, batch)
+    db.commit()
+    db.execute('ANALYZE')
+    db.close()
+
+def prepared_database(data_dir, rows, regenerate):
+    """Reuses a generated database of the same size unless asked to regenerate it."""
+    database = os.path.join(data_dir, f'history-{rows}.db')
+    marker = database + '.done'
+    if regenerate or not os.path.exists(marker):
+        started = time.perf_counter()
+        generate_history(database, rows)
+        with open(marker, 'w') as f:
+            f.write(str(round(time.perf_counter() - started, 3)))
+    return database
+
+# --- Scenarios ---
+
+def summarize_timings(samples):
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p95_ms': round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+def bench_probe_throughput(database, port, endpoints, sweeps):
+    """End-to-end concurrent sweeps (probe, assert, write) against the stub server."""
+    import app as monitor
+    app = open_app(database)
+    if os.path.exists(database):
+        os.remove(database)
+    monitor.init_db()
+    monitor.import_endpoints(
+        {'name': f'stub-{n}', 'url': f'http://127.0.0.1:{port}/ok/{n}', 'interval_seconds': 60}
+        for n in range(endpoints)
+    )
+    probes, started = 0, time.perf_counter()
+    with app.app_context():
+        for _ in range(sweeps):
+            probed, _, _ = monitor.run_all_endpoints(per_host_limit=monitor.app.config['PROBE_MAX_IN_FLIGHT'])
+            probes += probed
+    elapsed = time.perf_counter() - started
+    return {'endpoints': endpoints, 'probes': probes, 'seconds': round(elapsed, 3),
+            'probes_per_second': round(probes / elapsed, 1)}
+
+def bench_insert_rate(database, rows, batch_size):
+    """History inserts through the writer thread, in batches like the probe engine produces."""
+    import app as monitor
+    open_app(database)
+    if os.path.exists(database):
+        os.remove(database)
+    monitor.init_db()
+    monitor.run_write(lambda db: db.execute(
+        "INSERT INTO endpoints (name, url, method, headers, body, expected_status) "
+        "VALUES ('insert-bench', 'http://127.0.0.1:9/', 'GET', '{}', '{}', 200)"
+    ))
+    rng = random.Random(SEED)
+    endpoint = {'id': 1, 'expected_status': 200}
+    results = [
+        monitor.make_result(endpoint, 200, rng.randint(20, 400), json.dumps({'n': n % 20}))
+        for n in range(rows)
+    ]
+    writer = monitor.get_writer()
+    started = time.perf_counter()
+    futures = [writer.record(results[n:n + batch_size]) for n in range(0, rows, batch_size)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - started
+    return {'rows': rows, 'batch_size': batch_size, 'seconds': round(elapsed, 3),
+            'rows_per_second': round(rows / elapsed, 1)}
+
+def bench_routes(database, repeat):
+    """Latency of the web routes against a pre-generated database."""
+    app = open_app(database)
+    client = app.test_client()
+    db = sqlite3.connect(database)
+    endpoint_id = db.execute('SELECT id FROM endpoints ORDER BY id LIMIT 1').fetchone()[0]
+    # The cursor whose page holds the endpoint's oldest rows.
+    deep = db.execute(
+        'SELECT checked_at, id FROM history WHERE endpoint_id = ? ORDER BY checked_at, id LIMIT 1 OFFSET ?',
+        (endpoint_id, app.config['HISTORY_PAGE_SIZE'])
+    ).fetchone()
+    db.close()
+    routes = {
+        'dashboard': '/',
+        'endpoint_details': f'/endpoint/{endpoint_id}',
+        'endpoint_details_oldest_page': f'/endpoint/{endpoint_id}?before={deep[0]},{deep[1]}' if deep else None,
+        'stats_24h': f'/api/endpoint/{endpoint_id}/stats?window=24h',
+        'stats_30d': f'/api/endpoint/{endpoint_id}/stats?window=30d',
+    }
+    results = {}
+    for name, url in routes.items():
+        if url is None:
+            continue
+        client.get(url).close()  # warm the page cache and the read pool
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+        results[name] = summarize_timings(samples)
+    return results
+
+def in_child(fn, *args):
+    """Runs a scenario in a fresh process, so every scenario starts with cold app state."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args).result()
+
+# --- Reporting ---
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def flatten(results, prefix=''):
+    """Yields ('history_10000.dashboard.p50_ms', value) pairs for every numeric result."""
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f'{prefix}{key}.')
+        elif isinstance(value, (int, float)):
+            yield f'{prefix}{key}', value
+
+def compare(previous, current):
+    """Prints each metric next to its value in a previous results file."""
+    before = dict(flatten(previous['results']))
+    for key, value in flatten(current['results']):
+        if key in before and before[key]:
+            change = (value - before[key]) / before[key] * 100
+            click.echo(f'{key:60} {before[key]:>12} -> {value:>12} ({change:+.1f}%)')
+
+@click.command()
+@click.option('--sizes', default='10k,1m,10m', help='History sizes for route benchmarks, e.g. 10k,1m,10m.')
+@click.option('--endpoints', type=int, default=500, help='Endpoints probed per throughput sweep.')
+@click.option('--sweeps', type=int, default=5, help='Throughput sweeps over all endpoints.')
+@click.option('--insert-rows', type=int, default=100_000, help='Rows written by the insert benchmark.')
+@click.option('--batch-size', type=int, default=100, help='Rows per writer batch in the insert benchmark.')
+@click.option('--repeat', type=int, default=50, help='Requests timed per route.')
+@click.option('--data-dir', default='benchmark-data', help='Where generated databases are kept between runs.')
+@click.option('--regenerate', is_flag=True, help='Regenerate history databases even if they exist.')
+@click.option('--skip', multiple=True, type=click.Choice(['probes', 'inserts', 'routes']), help='Scenarios to skip.')
+@click.option('--output', type=click.Path(), default=None, help='Write results as JSON to this file.')
+@click.option('--compare', 'compare_with', type=click.File('r'), default=None, help='Previous results to compare.')
+def main(sizes, endpoints, sweeps, insert_rows, batch_size, repeat, data_dir, regenerate, skip, output, compare_with):
+    """Benchmarks probe throughput, insert rate and route latency."""
+    os.makedirs(data_dir, exist_ok=True)
+    report = {'environment': environment(), 'results': {}}
+    results = report['results']
+
+    if 'probes' not in skip:
+        stub, port = start_stub_server()
+        try:
+            results['probe_throughput'] = in_child(
+                bench_probe_throughput, os.path.join(data_dir, 'probes.db'), port, endpoints, sweeps
+            )
+        finally:
+            stub.terminate()
+        click.echo(f"probes: {results['probe_throughput']['probes_per_second']} probes/s", err=True)
+
+    if 'inserts' not in skip:
+        results['insert_rate'] = in_child(
+            bench_insert_rate, os.path.join(data_dir, 'inserts.db'), insert_rows, batch_size
+        )
+        click.echo(f"inserts: {results['insert_rate']['rows_per_second']} rows/s", err=True)
+
+    if 'routes' not in skip:
+        for size in [parse_size(size) for size in sizes.split(',') if size.strip()]:
+            started = time.perf_counter()
+            database = in_child(prepared_database, data_dir, size, regenerate)
+            click.echo(f'history {size}: database ready in {time.perf_counter() - started:.1f}s', err=True)
+            results[f'history_{size}'] = in_child(bench_routes, database, repeat)
+            for route, timing in results[f'history_{size}'].items():
+                click.echo(f"  {route}: p50 {timing['p50_ms']}ms p95 {timing['p95_ms']}ms", err=True)
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        click.echo(text)
+    if compare_with:
+        compare(json.load(compare_with), report)
+
+if __name__ == '__main__':
+    main()
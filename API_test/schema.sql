@@ -1,9 +1,16 @@
 -- schema.sql
 -- Defines the database structure for the API Monitoring Dashboard.
 
+-- Lets compaction hand freed pages back with PRAGMA incremental_vacuum (applies to new database files)
+PRAGMA auto_vacuum = INCREMENTAL;
+
 -- Drop existing tables to ensure a clean setup
 DROP TABLE IF EXISTS endpoints;
 DROP TABLE IF EXISTS history;
+DROP TABLE IF EXISTS latest_status;
+DROP TABLE IF EXISTS response_bodies;
+DROP TABLE IF EXISTS rollups;
+DROP TABLE IF EXISTS load_runs;
 
 -- Table to store the API endpoints to be monitored
 CREATE TABLE endpoints (
@@ -14,6 +21,11 @@ CREATE TABLE endpoints (
     headers TEXT, -- Stored as a JSON string
     body TEXT, -- Stored as a JSON string
     expected_status INTEGER NOT NULL DEFAULT 200,
+    interval_seconds INTEGER NOT NULL DEFAULT 60, -- how often the scheduler probes this endpoint
+    assertions TEXT, -- JSON list of response checks (jsonpath, regex, header, latency)
+    next_due_at REAL NOT NULL DEFAULT 0, -- unix time the next probe is due (probe workers)
+    lease_owner TEXT, -- probe worker currently holding this endpoint
+    lease_expires REAL, -- unix time the lease lapses if the worker never reports back
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -23,9 +35,86 @@ CREATE TABLE history (
     endpoint_id INTEGER NOT NULL,
     status_code INTEGER,
     response_time INTEGER, -- in milliseconds
-    response_body TEXT,
+    body_hash TEXT, -- response_bodies.hash, NULL for empty bodies
     is_success BOOLEAN NOT NULL,
     error_message TEXT,
+    failed_assertion TEXT, -- labels of the assertions this probe failed
+    probed_by TEXT, -- probe worker id, NULL when probed by the web process
+    dns_ms INTEGER, -- name resolution, only when a new connection was opened
+    connect_ms INTEGER, -- TCP connect
+    tls_ms INTEGER, -- TLS handshake
+    ttfb_ms INTEGER, -- request sent until response headers received
+    reused_connection BOOLEAN, -- served from a pooled keep-alive connection
     checked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (endpoint_id) REFERENCES endpoints (id)
 );
+
+-- Response bodies, compressed and stored once per distinct payload
+CREATE TABLE response_bodies (
+    hash TEXT PRIMARY KEY, -- SHA-256 of the UTF-8 body text
+    encoding TEXT NOT NULL, -- 'zstd' or 'gzip'
+    size INTEGER NOT NULL, -- uncompressed size in bytes
+    body BLOB NOT NULL
+);
+
+-- History is always read per endpoint, newest first
+CREATE INDEX idx_history_endpoint_checked ON history (endpoint_id, checked_at DESC, id DESC);
+CREATE INDEX idx_endpoints_name ON endpoints (name);
+CREATE INDEX idx_endpoints_due ON endpoints (next_due_at);
+CREATE INDEX idx_history_body_hash ON history (body_hash);
+
+-- Most recent result for each endpoint, so the dashboard never scans history
+CREATE TABLE latest_status (
+    endpoint_id INTEGER PRIMARY KEY,
+    history_id INTEGER NOT NULL,
+    is_success BOOLEAN NOT NULL,
+    status_code INTEGER,
+    response_time INTEGER,
+    checked_at TIMESTAMP NOT NULL
+);
+
+-- Keeps latest_status current on every history insert
+CREATE TRIGGER history_latest_status AFTER INSERT ON history BEGIN
+    INSERT INTO latest_status (endpoint_id, history_id, is_success, status_code, response_time, checked_at)
+    VALUES (NEW.endpoint_id, NEW.id, NEW.is_success, NEW.status_code, NEW.response_time, NEW.checked_at)
+    ON CONFLICT (endpoint_id) DO UPDATE SET
+        history_id = excluded.history_id, is_success = excluded.is_success, status_code = excluded.status_code,
+        response_time = excluded.response_time, checked_at = excluded.checked_at
+    WHERE excluded.checked_at >= latest_status.checked_at;
+END;
+
+-- Pre-aggregated probe results per endpoint at minute, hour and day resolution
+CREATE TABLE rollups (
+    endpoint_id INTEGER NOT NULL,
+    resolution INTEGER NOT NULL, -- bucket width in seconds: 60, 3600 or 86400
+    bucket_start INTEGER NOT NULL, -- unix time
+    probes INTEGER NOT NULL,
+    successes INTEGER NOT NULL,
+    sketch TEXT NOT NULL, -- DDSketch of response_time, JSON
+    PRIMARY KEY (endpoint_id, resolution, bucket_start)
+) WITHOUT ROWID;
+
+-- One row per `flask load-test` run; latencies are in milliseconds
+CREATE TABLE load_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    endpoint_id INTEGER NOT NULL,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    users INTEGER NOT NULL, -- concurrent virtual users
+    target_rps REAL NOT NULL,
+    duration_s REAL NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL, -- transport errors plus unexpected status codes
+    error_rate REAL,
+    achieved_rps REAL,
+    mean_ms REAL,
+    p50_ms REAL,
+    p90_ms REAL,
+    p99_ms REAL,
+    p999_ms REAL,
+    max_ms REAL,
+    error_breakdown TEXT, -- JSON: error kind -> count
+    histogram TEXT, -- HDR histogram of latency in microseconds, JSON
+    FOREIGN KEY (endpoint_id) REFERENCES endpoints (id)
+);
+
+CREATE INDEX idx_load_runs_endpoint ON load_runs (endpoint_id, id DESC);
@@ -7,7 +7,6 @@ import numpy as np
 import matplotlib.pyplot as plt
 import requests
 from bs4 import BeautifulSoup
-from transformers import pipeline
 import openai
 import gspread
 from google.oauth2.service_account import Credentials
@@ -15,13 +14,28 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime
 import json
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import queue
+import random
+import re
+import sqlite3
+import threading
 import time
 import warnings
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import ExitStack, closing
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from sentiment_worker import SentimentModel, serve as serve_sentiment
 
 warnings.filterwarnings('ignore')
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +43,22 @@ load_dotenv()
 # --- Configuration ---
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 NEWSAPI_KEY = os.getenv("NEWSAPI_KEY")
+CANDLE_DB_PATH = os.getenv("CANDLE_DB_PATH", "candles.sqlite")
+CANDLE_REFRESH_SECONDS = int(os.getenv("CANDLE_REFRESH_SECONDS", "900"))  # how often the newest bars are re-downloaded
+SENTIMENT_CACHE_PATH = os.getenv("SENTIMENT_CACHE_PATH", "sentiment_cache.sqlite")
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "20000"))  # headlines kept; least recently used go first
+SENTIMENT_CACHE_TTL = int(os.getenv("SENTIMENT_CACHE_TTL", str(7 * 24 * 3600)))  # seconds before a headline is scored again
+SENTIMENT_MODEL = "ProsusAI/finbert"
+SENTIMENT_BATCH_SIZE = 16
+SENTIMENT_WORKER = os.getenv("SENTIMENT_WORKER", "").lower() in ("1", "true", "yes")  # score headlines in one inference process shared by all sessions
+SENTIMENT_WORKER_WAIT = 0.05    # seconds the worker waits for other sessions' headlines before scoring a batch
+SENTIMENT_WORKER_BATCH = 128    # most headlines the worker collects into one batch
+SENTIMENT_WORKER_TIMEOUT = 120  # seconds a session waits for the worker's scores before it is marked dead
+SENTIMENT_WORKER_LOAD_TIMEOUT = 600  # seconds the worker may take to download and load the model
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "8"))  # threads for the network-bound steps of an analysis, shared by all sessions
+TICKER_INFO_TTL = 3600
+BACKTEST_FEE_BPS = 10       # brokerage and taxes per side, in basis points
+BACKTEST_SLIPPAGE_BPS = 5   # price impact per side, in basis points
 
 # --- Static Data & Mappings ---
 STOCK_CATEGORIES = {
@@ -65,6 +95,665 @@ STOCK_CATEGORIES = {
     "NIFTY FMCG Index": { "ticker": "^CNXFMCG", "individual_stocks": { "Hindustan Unilever": "HINDUNILVR.NS", "ITC": "ITC.NS", "Nestle India": "NESTLEIND.NS", "Britannia Industries": "BRITANNIA.NS", "Dabur India": "DABUR.NS", "Marico": "MARICO.NS", "Godrej Consumer Products": "GODREJCP.NS", "Colgate-Palmolive": "COLPAL.NS", "United Spirits": "UBL.NS", "Tata Consumer Products": "TATACONSUM.NS", "Emami": "EMAMILTD.NS", "P&G Hygiene": "PGHH.NS", "VBL": "VBL.NS" } }
 }
 
+# ==============================================================================
+# === PERSISTENT CANDLE STORE ==================================================
+# ==============================================================================
+
+def period_start(period: str, today: pd.Timestamp):
+    """First calendar day a yfinance period covers, or None for 'max'."""
+    if period == 'max': return None
+    if period == 'ytd': return today.replace(month=1, day=1)
+    match = re.fullmatch(r'(\d+)(d|mo|y)', period)
+    if not match: raise ValueError(f"Unsupported period: {period}")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == 'd': return today - pd.DateOffset(days=count * 2 + 7)  # trading days, plus room for weekends and holidays
+    return today - (pd.DateOffset(months=count) if unit == 'mo' else pd.DateOffset(years=count))
+
+class CandleStore:
+    """Daily OHLCV bars kept on disk in SQLite, clustered by (ticker, date) so each ticker is its own partition.
+
+    Every ticker remembers the earliest date it has been fetched from: asking for a longer
+    period downloads only the older bars that are missing, shorter periods are sliced from
+    what is stored, and the newest bars are re-downloaded at most every CANDLE_REFRESH_SECONDS.
+    """
+    COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.ticker_locks = defaultdict(threading.Lock)  # one download per ticker at a time; different tickers run in parallel
+        with closing(self._connect()) as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS candles (
+                    ticker TEXT NOT NULL, date TEXT NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL, volume REAL,
+                    PRIMARY KEY (ticker, date)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS coverage (
+                    ticker TEXT PRIMARY KEY,
+                    start TEXT,                             -- earliest date fetched from, NULL once the full history is stored
+                    timezone TEXT,
+                    refreshed_at REAL NOT NULL DEFAULT 0
+                );
+            """)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    def _download(self, ticker: str, start=None, end=None) -> pd.DataFrame:
+        stock = yf.Ticker(ticker)
+        if start is None: return stock.history(period='max')
+        return stock.history(start=start.strftime('%Y-%m-%d'), end=end.strftime('%Y-%m-%d') if end is not None else None)
+
+    def _locked(self, tickers) -> ExitStack:
+        """Holds the locks of `tickers`, taken in sorted order so concurrent callers cannot deadlock."""
+        with self.lock: locks = [self.ticker_locks[ticker] for ticker in sorted(set(tickers))]
+        stack = ExitStack()
+        for lock in locks: stack.enter_context(lock)
+        return stack
+
+    def _write(self, db, ticker: str, hist: pd.DataFrame):
+        if hist.empty: return
+        rows = hist[self.COLUMNS].astype(float)
+        db.executemany(
+            'INSERT OR REPLACE INTO candles (ticker, date, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(ticker, date, *values) for date, values in zip(hist.index.strftime('%Y-%m-%d'), rows.itertuples(index=False))]
+        )
+        if hist.index.tz is not None:
+            db.execute('UPDATE coverage SET timezone = ? WHERE ticker = ?', (str(hist.index.tz), ticker))
+
+    def _replace(self, db, ticker: str, start, hist: pd.DataFrame):
+        db.execute('DELETE FROM candles WHERE ticker = ?', (ticker,))
+        db.execute(
+            'INSERT OR REPLACE INTO coverage (ticker, start, refreshed_at) VALUES (?, ?, ?)',
+            (ticker, start.strftime('%Y-%m-%d') if start is not None else None, time.time())
+        )
+        self._write(db, ticker, hist)
+
+    def _mark_checked(self, db, ticker: str, start):
+        """Records a download that returned no bars, so the ticker is not fetched again until it is stale."""
+        db.execute(
+            'INSERT INTO coverage (ticker, start, refreshed_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(ticker) DO UPDATE SET refreshed_at = excluded.refreshed_at',
+            (ticker, start.strftime('%Y-%m-%d') if start is not None else None, time.time())
+        )
+
+    def _fetch_all(self, db, ticker: str, start):
+        """(Re)downloads everything from `start` (None = full history), replacing what is stored."""
+        hist = self._download(ticker, start)
+        with db: self._replace(db, ticker, start, hist)
+
+    def _refresh_tail(self, db, ticker: str, stored_start):
+        """Re-downloads the newest bars. Prices are split/dividend adjusted, so if an already stored
+        bar comes back different the adjustments have changed and the whole range is fetched again."""
+        last = db.execute('SELECT date, close FROM candles WHERE ticker = ? ORDER BY date DESC LIMIT 2', (ticker,)).fetchall()
+        if not last: return self._fetch_all(db, ticker, stored_start)
+        anchor_date, anchor_close = last[-1]  # the newest complete bar; the very last one may still be trading
+        hist = self._download(ticker, pd.Timestamp(anchor_date))
+        fresh = hist['Close'][hist.index.strftime('%Y-%m-%d') == anchor_date]
+        if not fresh.empty and not np.isclose(fresh.iloc[0], anchor_close, rtol=1e-4):
+            return self._fetch_all(db, ticker, stored_start)
+        with db:
+            self._write(db, ticker, hist)
+            db.execute('UPDATE coverage SET refreshed_at = ? WHERE ticker = ?', (time.time(), ticker))
+
+    def history(self, ticker: str, period: str = "1y") -> pd.DataFrame:
+        """Daily bars for `period`, downloading only what the store does not have yet."""
+        start = period_start(period, pd.Timestamp.now().normalize())
+        # Downloads happen outside transactions; only the writes that follow them are.
+        with self._locked([ticker]), closing(self._connect()) as db:
+            coverage = db.execute('SELECT start, refreshed_at FROM coverage WHERE ticker = ?', (ticker,)).fetchone()
+            if coverage is None:
+                self._fetch_all(db, ticker, start)
+            else:
+                stored_start = pd.Timestamp(coverage[0]) if coverage[0] else None
+                if time.time() - coverage[1] > CANDLE_REFRESH_SECONDS:
+                    self._refresh_tail(db, ticker, stored_start)
+                if stored_start is not None and (start is None or start < stored_start):
+                    # Backfill only the older bars; a full-history request has no start to fetch from.
+                    older = self._download(ticker, start, stored_start) if start is not None else self._download(ticker)
+                    with db:
+                        self._write(db, ticker, older)
+                        db.execute(
+                            'UPDATE coverage SET start = ? WHERE ticker = ?',
+                            (start.strftime('%Y-%m-%d') if start is not None else None, ticker)
+                        )
+            return self._read(db, ticker, start, period)
+
+    def _read(self, db, ticker: str, start, period: str) -> pd.DataFrame:
+        timezone = db.execute('SELECT timezone FROM coverage WHERE ticker = ?', (ticker,)).fetchone()
+        rows = db.execute(
+            'SELECT date, open, high, low, close, volume FROM candles WHERE ticker = ? AND date >= ? ORDER BY date',
+            (ticker, start.strftime('%Y-%m-%d') if start is not None else '')
+        ).fetchall()
+        hist = pd.DataFrame([row[1:] for row in rows], columns=self.COLUMNS,
+                            index=pd.DatetimeIndex(pd.to_datetime([row[0] for row in rows]), name='Date'))
+        hist.index = hist.index.tz_localize((timezone and timezone[0]) or 'UTC')
+        days = re.fullmatch(r'(\d+)d', period)
+        if days: hist = hist.tail(int(days.group(1)))
+        return hist
+
+    def history_many(self, tickers, period: str = "1y") -> pd.DataFrame:
+        """Bars for many tickers as one (field, ticker) frame indexed by local date, like `yf.download`.
+
+        Every ticker that is missing, stale or too short is fetched in a single bulk download
+        and replaces what was stored, so a whole index costs one request instead of one per stock.
+        """
+        start = period_start(period, pd.Timestamp.now().normalize())
+        with self._locked(tickers), closing(self._connect()) as db:
+            stale, fetch_start = [], start
+            for ticker in tickers:
+                coverage = db.execute('SELECT start, refreshed_at FROM coverage WHERE ticker = ?', (ticker,)).fetchone()
+                stored_start = pd.Timestamp(coverage[0]) if coverage and coverage[0] else None
+                too_short = coverage is not None and stored_start is not None and (start is None or start < stored_start)
+                if coverage is None or too_short or time.time() - coverage[1] > CANDLE_REFRESH_SECONDS:
+                    stale.append(ticker)
+                    if coverage is not None and fetch_start is not None and (stored_start is None or stored_start < fetch_start):
+                        fetch_start = stored_start  # keep the longer history this ticker already has
+            if stale:
+                bulk = yf.download(stale, period='max' if fetch_start is None else None,
+                                   start=fetch_start.strftime('%Y-%m-%d') if fetch_start is not None else None,
+                                   group_by='ticker', auto_adjust=True, threads=True, progress=False)
+                if not isinstance(bulk.columns, pd.MultiIndex): bulk = pd.concat({stale[0]: bulk}, axis=1)
+                with db:
+                    for ticker in stale:
+                        hist = bulk[ticker].dropna(how='all') if ticker in bulk.columns.get_level_values(0) else bulk.iloc[:0]
+                        # A failed or empty download keeps whatever was stored before.
+                        if hist.empty: self._mark_checked(db, ticker, fetch_start)
+                        else: self._replace(db, ticker, fetch_start, hist)
+            frames = {}
+            for ticker in tickers:
+                hist = self._read(db, ticker, start, period)
+                if not hist.empty: frames[ticker] = hist.tz_localize(None)
+        if not frames: return pd.DataFrame()
+        return pd.concat(frames, axis=1).swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+# Streamlit re-executes this script on every interaction; st.cache_resource keeps one instance per process.
+@st.cache_resource
+def get_candle_store(path: str) -> CandleStore:
+    return CandleStore(path)
+
+candle_store = get_candle_store(CANDLE_DB_PATH)
+
+# ==============================================================================
+# === INDICATOR ENGINE =========================================================
+# ==============================================================================
+
+def rolling_mean_matrix(values: np.ndarray, window: int) -> np.ndarray:
+    """Column-wise simple moving average (NaN until `window` rows), from one cumulative sum."""
+    sums = np.cumsum(values, axis=0)
+    out = np.full_like(values, np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sums[window - 1:] - np.vstack([np.zeros((1, values.shape[1])), sums[:-window]])
+        out[window - 1:] /= window
+    return out
+
+INDICATOR_DEFAULTS = {'rsi_window': 14, 'macd_spans': (12, 26, 9), 'ema_spans': (20, 50, 200)}
+
+def ema_matrices(values: np.ndarray, spans) -> dict:
+    """Column-wise EMAs for several spans, all updated in one loop over the rows.
+
+    Each EMA starts at the column's first value, like pandas' `ewm(adjust=False)`; gaps after
+    that are forward-filled, and rows before a column's first value stay NaN.
+    """
+    spans = sorted(set(spans))
+    alphas = (2 / (np.array(spans, dtype=float) + 1))[:, None]
+    listed = np.maximum.accumulate(~np.isnan(values), axis=0)
+    filled = pd.DataFrame(values).ffill().bfill().to_numpy()  # seed each EMA with the first value
+    out = np.empty((len(spans),) + values.shape)
+    state = np.repeat(filled[:1], len(spans), axis=0)
+    for i, row in enumerate(filled):
+        state += alphas * (row - state)
+        out[:, i] = state
+    out[:, ~listed] = np.nan
+    return {span: out[k] for k, span in enumerate(spans)}
+
+def rsi_matrix(close: np.ndarray, window: int) -> np.ndarray:
+    """Column-wise RSI from simple moving averages of gains and losses."""
+    delta = np.diff(close, axis=0, prepend=np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gain = rolling_mean_matrix(np.where(delta > 0, delta, 0.0), window)
+        loss = rolling_mean_matrix(np.where(delta < 0, -delta, 0.0), window)
+        return 100 - 100 / (1 + gain / loss)
+
+def indicator_matrices(close: np.ndarray, rsi_window=14, macd_spans=(12, 26, 9), ema_spans=(20, 50, 200)) -> dict:
+    """RSI, MACD and EMAs for a dates x tickers close matrix.
+
+    All EMA spans (including MACD's fast and slow) come from one loop over the bars for every
+    ticker at once, and the MACD signal line from a second.
+    """
+    fast, slow, signal_span = macd_spans
+    emas = ema_matrices(close, set(ema_spans) | {fast, slow})
+    macd_line = emas[fast] - emas[slow]
+    signal = ema_matrices(macd_line, [signal_span])[signal_span]
+    indicators = {'RSI': rsi_matrix(close, rsi_window), 'MACD_line': macd_line, 'MACD_signal': signal, 'MACD_histogram': macd_line - signal}
+    indicators.update({f'EMA_{span}': emas[span] for span in ema_spans})
+    return indicators
+
+def signal_votes(rsi, histogram, price, ema_short, ema_long, rsi_buy=40, rsi_sell=60):
+    """Bullish and bearish votes (0-3) per bar from RSI, MACD histogram and EMA trend.
+
+    Works on NumPy arrays, Series or dates x tickers frames alike; `generate_signal` and the
+    backtester both build on it.
+    """
+    bullish = (rsi < rsi_buy).astype(int) + (histogram > 0) + ((price > ema_short) & (ema_short > ema_long))
+    bearish = (rsi > rsi_sell).astype(int) + (histogram < 0) + ((price < ema_short) & (ema_short < ema_long))
+    return bullish, bearish
+
+class IndicatorEngine:
+    """Computes indicators for many tickers in one NumPy pass and memoizes them per ticker.
+
+    Results are keyed by (ticker, first bar, last bar, bar count, hash of the closes, parameters),
+    so the chart, the signal logic and repeat runs on the same bars reuse one computation, while a
+    new bar, a revised intraday close or a different period computes afresh. Streamlit's data cache
+    hands out copies of the price frame, which is why the key is built from the bars rather than
+    the object.
+    """
+    MAX_ENTRIES = 512
+
+    def __init__(self):
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def compute(self, close: pd.DataFrame, memoize=True, **params) -> dict:
+        """Indicator name -> dates x tickers frame, for every column of `close`."""
+        if close.empty: return {}
+        params = {name: tuple(value) if isinstance(value, list) else value for name, value in {**INDICATOR_DEFAULTS, **params}.items()}
+        bars = (close.index[0], close.index[-1], len(close.index))
+        values = close.to_numpy(dtype=float)
+        keys = {
+            ticker: (ticker,) + bars + (hashlib.blake2b(np.ascontiguousarray(values[:, col]).tobytes(), digest_size=8).digest(),
+                                        tuple(sorted(params.items())))
+            for col, ticker in enumerate(close.columns)
+        }
+        with self.lock:
+            found = {ticker: self.cache[key] for ticker, key in keys.items() if memoize and key in self.cache}
+            for ticker in found: self.cache.move_to_end(keys[ticker])
+        missing = [ticker for ticker in close.columns if ticker not in found]
+        matrices = None
+        if missing:
+            matrices = indicator_matrices(values if len(missing) == len(close.columns) else close[missing].to_numpy(dtype=float), **params)
+            for col, ticker in enumerate(missing):
+                found[ticker] = {name: matrix[:, col] for name, matrix in matrices.items()}
+            if memoize:
+                with self.lock:
+                    for ticker in missing: self.cache[keys[ticker]] = found[ticker]
+                    while len(self.cache) > self.MAX_ENTRIES: self.cache.popitem(last=False)
+        if len(missing) == len(close.columns):
+            return {name: pd.DataFrame(matrix, index=close.index, columns=close.columns) for name, matrix in matrices.items()}
+        return {
+            name: pd.DataFrame(np.column_stack([found[ticker][name] for ticker in close.columns]), index=close.index, columns=close.columns)
+            for name in found[close.columns[0]]
+        }
+
+    def for_ticker(self, ticker, close: pd.Series, **params) -> dict:
+        """Indicator name -> Series for one ticker; without a ticker nothing is memoized."""
+        frames = self.compute(close.to_frame(ticker or close.name), memoize=ticker is not None, **params)
+        return {name: frame.iloc[:, 0].rename(name) for name, frame in frames.items()}
+
+@st.cache_resource
+def get_indicator_engine() -> IndicatorEngine:
+    return IndicatorEngine()
+
+indicator_engine = get_indicator_engine()
+
+# ==============================================================================
+# === BACKTESTING ==============================================================
+# ==============================================================================
+
+STRATEGY_DEFAULTS = {**INDICATOR_DEFAULTS, 'rsi_buy': 40, 'rsi_sell': 60}
+
+def hold_forward(target: np.ndarray) -> np.ndarray:
+    """Replaces NaN (no new signal) with the last position taken in each column, starting flat."""
+    rows = np.where(np.isnan(target), 0, np.arange(len(target))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.nan_to_num(target[rows, np.arange(target.shape[1])], nan=0.0)
+
+def backtest(close: np.ndarray, bullish: np.ndarray, bearish: np.ndarray,
+             fee_bps=BACKTEST_FEE_BPS, slippage_bps=BACKTEST_SLIPPAGE_BPS, periods_per_year=252) -> dict:
+    """Long-only simulation of the Buy/Sell signals for every column of a dates x strategies matrix.
+
+    A Buy bar goes long at that bar's close, a Sell bar goes flat, Hold keeps the position.
+    Every change of position pays fees plus slippage. Returns per-column arrays of metrics
+    and the equity curves.
+    """
+    listed = np.maximum.accumulate(~np.isnan(close), axis=0)
+    prices = pd.DataFrame(close).ffill().to_numpy()
+    position = hold_forward(np.where(bearish >= 2, 0.0, np.where(bullish >= 2, 1.0, np.nan)))
+    position[~listed] = 0.0
+    held = np.vstack([np.zeros((1, close.shape[1])), position[:-1]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        asset_returns = np.nan_to_num(np.vstack([np.zeros((1, close.shape[1])), prices[1:] / prices[:-1] - 1]))
+    turnover = np.abs(position - held)
+    returns = held * asset_returns - turnover * (fee_bps + slippage_bps) / 1e4
+    equity = np.cumprod(1 + returns, axis=0)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+
+    # Each trade runs from the bar that enters to the bar that exits; sum its log returns per (column, trade).
+    trade_ids = np.cumsum((position == 1) & (held == 0), axis=0)
+    in_trade = (position == 1) | (held == 1)
+    trades = trade_ids[-1]
+    slots = trades.max() + 1
+    buckets = (trade_ids + np.arange(close.shape[1]) * slots)[in_trade]
+    trade_returns = np.bincount(buckets, weights=np.log1p(returns)[in_trade], minlength=close.shape[1] * slots)
+    wins = (trade_returns.reshape(close.shape[1], slots)[:, 1:] > 0).sum(axis=1)
+
+    bars = listed.sum(axis=0)
+    listed_returns = np.where(listed, returns, np.nan)
+    first_price = prices[np.argmax(listed, axis=0), np.arange(close.shape[1])]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'total_return': equity[-1] - 1,
+            'cagr': np.where(bars > 1, equity[-1] ** (periods_per_year / np.maximum(bars - 1, 1)) - 1, np.nan),
+            'max_drawdown': drawdown.min(axis=0),
+            'hit_rate': np.where(trades > 0, wins / trades, np.nan),
+            'trades': trades,
+            'exposure': np.where(bars > 0, held.sum(axis=0) / bars, np.nan),
+            'buy_hold_return': prices[-1] / first_price - 1,
+            'sharpe': np.nanmean(listed_returns, axis=0) / np.nanstd(listed_returns, axis=0) * np.sqrt(periods_per_year),
+            'equity': equity,
+        }
+
+def backtest_strategies(close: pd.DataFrame, strategies=None, fee_bps=BACKTEST_FEE_BPS, slippage_bps=BACKTEST_SLIPPAGE_BPS):
+    """Backtests every strategy (a dict overriding STRATEGY_DEFAULTS) on every ticker of a close frame.
+
+    Indicators come from the memoized engine, one pass per distinct set of windows; the signals
+    of all (strategy, ticker) pairs then go through a single vectorized `backtest` call. Returns
+    a summary frame and the equity curves, both indexed by (strategy number, ticker).
+    """
+    strategies = strategies or [{}]
+    bullish, bearish = [], []
+    for strategy in strategies:
+        strategy = {**STRATEGY_DEFAULTS, **strategy}
+        indicators = indicator_engine.compute(close, **{name: strategy[name] for name in INDICATOR_DEFAULTS})
+        short, long = strategy['ema_spans'][:2]
+        votes = signal_votes(indicators['RSI'].to_numpy(), indicators['MACD_histogram'].to_numpy(), close.to_numpy(dtype=float),
+                             indicators[f'EMA_{short}'].to_numpy(), indicators[f'EMA_{long}'].to_numpy(),
+                             strategy['rsi_buy'], strategy['rsi_sell'])
+        bullish.append(votes[0]); bearish.append(votes[1])
+    prices = np.tile(close.to_numpy(dtype=float), len(strategies))
+    results = backtest(prices, np.hstack(bullish), np.hstack(bearish), fee_bps, slippage_bps)
+    columns = pd.MultiIndex.from_product([range(len(strategies)), close.columns], names=['Strategy', 'Ticker'])
+    equity = pd.DataFrame(results.pop('equity'), index=close.index, columns=columns)
+    return pd.DataFrame(results, index=columns), equity
+
+# ==============================================================================
+# === PARAMETER OPTIMIZER ======================================================
+# ==============================================================================
+
+PARAMETER_GRID = {
+    'rsi_window': [7, 10, 14, 21],
+    'rsi_buy': [30, 35, 40, 45],
+    'rsi_sell': [55, 60, 65, 70],
+    'macd_spans': [(5, 35, 5), (8, 17, 9), (12, 26, 9)],
+    'ema_spans': [(10, 30), (20, 50), (50, 200)],
+}
+OPTIMIZER_METRICS = ['sharpe', 'total_return', 'cagr', 'max_drawdown', 'hit_rate', 'trades']
+
+def parameter_grid(grid=None, samples=None, seed=0) -> list:
+    """Every combination of `grid` (grid search), or `samples` of them drawn at random (random search)."""
+    grid = grid or PARAMETER_GRID
+    strategies = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    strategies = [strategy for strategy in strategies if strategy.get('rsi_buy', 0) < strategy.get('rsi_sell', 100)]
+    if samples and samples < len(strategies): strategies = random.Random(seed).sample(strategies, samples)
+    return strategies
+
+class ParameterSweep:
+    """State of one worker's share of a sweep: prices, split, costs and the indicator arrays computed so far."""
+
+    def __init__(self, close, split, fee_bps, slippage_bps):
+        self.close, self.split = close, split
+        self.fee_bps, self.slippage_bps = fee_bps, slippage_bps
+        self.arrays = {}
+
+    def array(self, key, compute):
+        """Indicator arrays are cached per window, so strategies that share a window compute it once."""
+        if key not in self.arrays: self.arrays[key] = compute()
+        return self.arrays[key]
+
+    def votes(self, strategy):
+        close, arrays = self.close, self.arrays
+        fast, slow, signal_span = strategy['macd_spans']
+        short, long = strategy['ema_spans'][:2]
+        missing = {fast, slow, short, long} - {key[1] for key in arrays if key[0] == 'ema'}
+        if missing: arrays.update({('ema', span): ema for span, ema in ema_matrices(close, missing).items()})
+        rsi = self.array(('rsi', strategy['rsi_window']), lambda: rsi_matrix(close, strategy['rsi_window']))
+        def histogram():
+            line = arrays[('ema', fast)] - arrays[('ema', slow)]
+            return line - ema_matrices(line, [signal_span])[signal_span]
+        macd_histogram = self.array(('macd', fast, slow, signal_span), histogram)
+        return signal_votes(rsi, macd_histogram, close, arrays[('ema', short)], arrays[('ema', long)],
+                            strategy['rsi_buy'], strategy['rsi_sell'])
+
+    def run(self, strategies, batch=16) -> list:
+        """Backtests strategies on every ticker, in and out of sample; returns mean metrics per strategy."""
+        rows = []
+        for i in range(0, len(strategies), batch):
+            rows += self._run_batch(strategies[i:i + batch])
+        return rows
+
+    def _run_batch(self, strategies) -> list:
+        close, split = self.close, self.split
+        votes = [self.votes({**STRATEGY_DEFAULTS, **strategy}) for strategy in strategies]
+        bullish, bearish = np.hstack([v[0] for v in votes]), np.hstack([v[1] for v in votes])
+        prices = np.tile(close, len(strategies))
+        rows = []
+        for sample, period in (('IS', slice(None, split)), ('OOS', slice(split, None))):
+            results = backtest(prices[period], bullish[period], bearish[period], self.fee_bps, self.slippage_bps)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # tickers without trades have NaN hit rates
+                means = {metric: np.nanmean(results[metric].reshape(len(strategies), -1), axis=1) for metric in OPTIMIZER_METRICS}
+            rows.append({f'{sample} {metric}': values for metric, values in means.items()})
+        return [{name: values[i] for part in rows for name, values in part.items()} for i in range(len(strategies))]
+
+def optimize_strategy(close: pd.DataFrame, strategies=None, objective='sharpe', oos_fraction=0.3, top=10,
+                      fee_bps=BACKTEST_FEE_BPS, slippage_bps=BACKTEST_SLIPPAGE_BPS) -> pd.DataFrame:
+    """Ranks strategies by their in-sample `objective` (averaged over tickers) and reports the best
+    `top` together with their out-of-sample results on the last `oos_fraction` of the bars.
+
+    Strategies are sorted by window so a single sweep computes every EMA, RSI and MACD window once
+    and reuses it across all the strategies that share it.
+    """
+    strategies = strategies or parameter_grid()
+    values = close.to_numpy(dtype=float)
+    split = int(len(values) * (1 - oos_fraction))
+    strategies = sorted(strategies, key=lambda strategy: tuple(str(strategy.get(name)) for name in INDICATOR_DEFAULTS))
+    results = ParameterSweep(values, split, fee_bps, slippage_bps).run(strategies) if strategies else []
+    table = pd.concat([pd.DataFrame(strategies), pd.DataFrame(results)], axis=1)
+    return table.sort_values(f'IS {objective}', ascending=False).head(top).reset_index(drop=True)
+
+# ==============================================================================
+# === SENTIMENT CACHE ==========================================================
+# ==============================================================================
+
+class SentimentCache:
+    """Headline sentiment scores kept on disk, keyed by a hash of the model and the headline text.
+
+    Entries expire SENTIMENT_CACHE_TTL seconds after they were scored, and beyond
+    SENTIMENT_CACHE_SIZE entries the least recently used are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: int):
+        self.path, self.max_entries, self.ttl = path, max_entries, ttl
+        self.lock = threading.Lock()
+        with closing(self._connect()) as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS scores (
+                    key TEXT PRIMARY KEY, score REAL NOT NULL, scored_at REAL NOT NULL, used_at REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_scores_used_at ON scores (used_at);
+            """)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\n{text}".encode()).hexdigest()
+
+    def get_many(self, keys) -> dict:
+        keys = list(dict.fromkeys(keys))
+        if not keys: return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        with self.lock, closing(self._connect()) as db, db:
+            rows = db.execute(
+                f'SELECT key, score FROM scores WHERE key IN ({placeholders}) AND scored_at >= ?', (*keys, now - self.ttl)
+            ).fetchall()
+            if rows: db.executemany('UPDATE scores SET used_at = ? WHERE key = ?', [(now, key) for key, _ in rows])
+        return dict(rows)
+
+    def put_many(self, scores: dict):
+        if not scores: return
+        now = time.time()
+        with self.lock, closing(self._connect()) as db, db:
+            db.executemany('INSERT OR REPLACE INTO scores (key, score, scored_at, used_at) VALUES (?, ?, ?, ?)',
+                           [(key, float(score), now, now) for key, score in scores.items()])
+            db.execute('DELETE FROM scores WHERE scored_at < ?', (now - self.ttl,))
+            db.execute('DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY used_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+@st.cache_resource
+def get_sentiment_cache(path: str) -> SentimentCache:
+    return SentimentCache(path, SENTIMENT_CACHE_SIZE, SENTIMENT_CACHE_TTL)
+
+sentiment_cache = get_sentiment_cache(SENTIMENT_CACHE_PATH)
+
+# ==============================================================================
+# === SENTIMENT MODEL ==========================================================
+# ==============================================================================
+
+class SentimentWorker:
+    """Client for the inference worker process; same interface as SentimentModel.
+
+    The worker is given SENTIMENT_WORKER_LOAD_TIMEOUT seconds to load the model and each request
+    SENTIMENT_WORKER_TIMEOUT seconds; past either deadline, or if the process exits, it is marked dead
+    and headlines are scored by the in-process model instead."""
+
+    def __init__(self):
+        # Spawned: forking the multithreaded server can deadlock the child, and a spawned child
+        # imports serve_sentiment from the sentiment_worker module rather than from this script.
+        context = multiprocessing.get_context('spawn')
+        self.requests, self.responses = context.Queue(), context.Queue()
+        self.process = context.Process(target=serve_sentiment, name="sentiment-worker", daemon=True,
+                                       args=(self.requests, self.responses, SENTIMENT_MODEL, SENTIMENT_BATCH_SIZE,
+                                             SENTIMENT_WORKER_WAIT, SENTIMENT_WORKER_BATCH))
+        self.process.start()
+        deadline = time.monotonic() + SENTIMENT_WORKER_LOAD_TIMEOUT
+        while True:
+            try: _, self.model, _ = self.responses.get(timeout=1); break
+            except queue.Empty:
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    self.process.terminate()
+                    raise RuntimeError("Sentiment worker exited or timed out while loading the model.")
+        self.dead = False
+        self.pending = {}
+        self.request_ids = itertools.count()
+        self.lock = threading.Lock()
+        threading.Thread(target=self._collect, name="sentiment-results", daemon=True).start()
+
+    def __call__(self, headlines) -> list:
+        headlines = list(headlines)
+        if not self.dead:
+            future = Future()
+            with self.lock:
+                request_id = next(self.request_ids)
+                self.pending[request_id] = future
+            self.requests.put((request_id, headlines))
+            try:
+                deadline = time.monotonic() + SENTIMENT_WORKER_TIMEOUT
+                while not self.dead:
+                    try: return future.result(timeout=1)
+                    except FutureTimeoutError:
+                        if not self.process.is_alive(): self.stop(f"exited with code {self.process.exitcode}")
+                        elif time.monotonic() > deadline: self.stop(f"returned no scores within {SENTIMENT_WORKER_TIMEOUT}s")
+            finally:
+                with self.lock: self.pending.pop(request_id, None)
+        return get_sentiment_model(use_worker=False)(headlines)
+
+    def stop(self, reason):
+        """Marks the worker dead and terminates its process; later requests are scored in-process."""
+        with self.lock:
+            if self.dead: return
+            self.dead = True
+        logger.warning("Sentiment worker %s; scoring headlines in-process instead.", reason)
+        self.process.terminate()
+
+    def _collect(self):
+        while not self.dead:
+            try: request_id, scores, error = self.responses.get(timeout=1)
+            except queue.Empty: continue
+            except (EOFError, OSError): return
+            with self.lock: future = self.pending.pop(request_id, None)
+            if future is None: continue
+            if error: future.set_exception(RuntimeError(error))
+            else: future.set_result(scores)
+
+@st.cache_resource(show_spinner=False)
+def get_sentiment_model(use_worker=SENTIMENT_WORKER):
+    """The sentiment model shared by every session, loaded on first use: the inference worker
+    when `use_worker` is set, otherwise a copy in this process."""
+    if use_worker:
+        try: return SentimentWorker()
+        except Exception as e: logger.warning("Sentiment worker unavailable, loading the model in-process: %s", e)
+    return SentimentModel(SENTIMENT_MODEL, SENTIMENT_BATCH_SIZE)
+
+def shared_sentiment_model():
+    """get_sentiment_model(), or the in-process model once the inference worker has been marked dead."""
+    model = get_sentiment_model()
+    if isinstance(model, SentimentWorker) and (model.dead or not model.process.is_alive()):
+        model.stop(f"exited with code {model.process.exitcode}")
+        return get_sentiment_model(use_worker=False)
+    return model
+
+# ==============================================================================
+# === BACKGROUND WORK ==========================================================
+# ==============================================================================
+
+@st.cache_resource
+def get_analysis_pool() -> ThreadPoolExecutor:
+    """Threads for the network-bound steps of an analysis (prices, company info, news, AI summary)."""
+    return ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+
+def submit_with_context(fn, *args):
+    """Runs `fn` on the analysis pool with the calling session's script context, so st.cache_data
+    and st messages work inside it."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    def run():
+        if ctx: add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return get_analysis_pool().submit(run)
+
+class SheetsLogger:
+    """Appends rows to Google Sheets from one background thread, so logging never delays an analysis."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.failures = 0
+        self.last_error = None
+        threading.Thread(target=self._run, name="sheets-logger", daemon=True).start()
+
+    def submit(self, sheet, row) -> bool:
+        if not sheet: return False
+        self.queue.put((sheet, row))
+        return True
+
+    def _run(self):
+        while True:
+            sheet, row = self.queue.get()
+            try:
+                sheet.append_row(row)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+
+@st.cache_resource
+def get_sheets_logger() -> SheetsLogger:
+    return SheetsLogger()
+
 # ==============================================================================
 # === GLOBAL HELPER FUNCTIONS (Defined before they are called) =================
 # ==============================================================================
@@ -103,16 +792,16 @@ def search_for_ticker(query: str, asset_type: str = "EQUITY") -> dict:
         st.warning(f"Could not connect to Yahoo Finance search: {e}")
         return {}
 
-@st.cache_data
+@st.cache_data(ttl=TICKER_INFO_TTL)
+def fetch_ticker_info(ticker) -> dict:
+    """Company info from yfinance; concurrent calls for the same ticker share one request."""
+    return yf.Ticker(ticker).info
+
+@st.cache_data(ttl=CANDLE_REFRESH_SECONDS)
 def fetch_stock_data(ticker, period="1y"):
-    """Fetch stock data using yfinance."""
+    """Fetch stock data using yfinance, served from the on-disk candle store."""
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        if not info.get('longName') and not info.get('shortName'):
-             st.error(f"Ticker '{ticker}' not found or is invalid.")
-             return None
-        hist = stock.history(period=period)
+        hist = candle_store.history(ticker, period)
         if hist.empty:
             st.error(f"No historical data found for ticker: {ticker}.")
             return None
@@ -121,17 +810,25 @@ def fetch_stock_data(ticker, period="1y"):
         st.error(f"Error fetching data for '{ticker}': {e}")
         return None
 
-def create_plotly_charts(data, ticker_name):
-    """Creates a focused trading chart with Price/EMAs, RSI, and color-coded Volume."""
+@st.cache_data(ttl=CANDLE_REFRESH_SECONDS)
+def fetch_batch_data(tickers: tuple, period="1y"):
+    """Fetch many tickers at once as a (field, ticker) frame; stale tickers share one bulk download."""
+    try:
+        return candle_store.history_many(tickers, period)
+    except Exception as e:
+        st.error(f"Error fetching data for {len(tickers)} tickers: {e}")
+        return None
+
+def create_plotly_charts(data, ticker_name, indicators):
+    """Creates a focused trading chart with Price/EMAs, RSI, and color-coded Volume from precomputed indicators."""
     fig = make_subplots(
         rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.03,
         subplot_titles=('Price & EMAs', 'RSI', 'Volume'), row_heights=[0.6, 0.2, 0.2]
     )
     fig.add_trace(go.Scatter(x=data.index, y=data['Close'], mode='lines', name='Price', line=dict(color='white', width=2)), row=1, col=1)
     for span, color in zip([20, 50, 200], ['#1f77b4', '#ff7f0e', '#d62728']):
-        fig.add_trace(go.Scatter(x=data.index, y=data['Close'].ewm(span=span, adjust=False).mean(), mode='lines', name=f'EMA {span}', line=dict(width=1.5, color=color)), row=1, col=1)
-    rsi_series = 100 - (100 / (1 + (data['Close'].diff().where(lambda x: x > 0, 0).rolling(14).mean() / -data['Close'].diff().where(lambda x: x < 0, 0).rolling(14).mean())))
-    fig.add_trace(go.Scatter(x=data.index, y=rsi_series, mode='lines', name='RSI', line=dict(color='#9467bd')), row=2, col=1)
+        fig.add_trace(go.Scatter(x=data.index, y=indicators[f'EMA_{span}'], mode='lines', name=f'EMA {span}', line=dict(width=1.5, color=color)), row=1, col=1)
+    fig.add_trace(go.Scatter(x=data.index, y=indicators['RSI'], mode='lines', name='RSI', line=dict(color='#9467bd')), row=2, col=1)
     rsi_lines = [
         {'y': 70, 'dash': 'dash', 'text': 'Overbought'}, {'y': 60, 'dash': 'dot', 'text': ''},
         {'y': 40, 'dash': 'dot', 'text': ''}, {'y': 30, 'dash': 'dash', 'text': 'Oversold'}
@@ -139,7 +836,7 @@ def create_plotly_charts(data, ticker_name):
     for line in rsi_lines:
         fig.add_hline(y=line['y'], line_dash=line['dash'], line_color="grey", row=2, col=1,
                       annotation_text=line['text'], annotation_position="right")
-    colors = ['#2ca02c' if row['Close'] >= row['Open'] else '#d62728' for index, row in data.iterrows()]
+    colors = np.where(data['Close'] >= data['Open'], '#2ca02c', '#d62728')
     fig.add_trace(go.Bar(x=data.index, y=data['Volume'], name='Volume', marker_color=colors), row=3, col=1)
     fig.update_layout(height=800, title_text=f'Technical Analysis for {ticker_name}', showlegend=True,
                       legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
@@ -185,82 +882,97 @@ def setup_google_sheets():
         return None
 
 def log_to_sheets(sheet, data):
-    """Logs a row of data to the specified Google Sheet."""
-    if sheet:
-        try:
-            sheet.append_row(data)
-            return True
-        except Exception as e:
-            st.warning(f"Failed to log to sheets: {e}")
-    return False
+    """Queues a row of data for the specified Google Sheet; it is appended in the background."""
+    logger = get_sheets_logger()
+    if logger.last_error: st.warning(f"Failed to log to sheets ({logger.failures} rows so far): {logger.last_error}")
+    return logger.submit(sheet, data)
 
 # ==============================================================================
 # === PRIMARY ANALYSIS CLASS ===================================================
 # ==============================================================================
 
 class StockAnalyzer:
-    def __init__(self):
-        self.sentiment_analyzer = None
-        self.setup_sentiment_analyzer()
-        
-    def setup_sentiment_analyzer(self):
-        try: self.sentiment_analyzer = pipeline("sentiment-analysis", model="ProsusAI/finbert", return_all_scores=True)
-        except: self.sentiment_analyzer = pipeline("sentiment-analysis")
-    
-    def compute_rsi(self, data, window=14):
-        try:
-            delta = data['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-            rs = gain / loss
-            return 100 - (100 / (1 + rs))
+    @property
+    def sentiment_analyzer(self):
+        """The process-wide sentiment model; loaded on first use rather than per session."""
+        return shared_sentiment_model()
+
+    def compute_indicators(self, data, ticker=None, rsi_window=14):
+        """All indicators for `data['Close']` (a Series, or a dates x tickers frame), memoized per ticker and bar."""
+        close = data['Close']
+        if isinstance(close, pd.DataFrame): return indicator_engine.compute(close, rsi_window=rsi_window)
+        return indicator_engine.for_ticker(ticker, close, rsi_window=rsi_window)
+
+    def compute_rsi(self, data, window=14, ticker=None):
+        try: return self.compute_indicators(data, ticker, rsi_window=window)['RSI']
         except: return pd.Series([50.0] * len(data), index=data.index)
 
-    def compute_macd(self, data):
+    def compute_macd(self, data, ticker=None):
         """Computes MACD values for the entire dataset."""
         try:
-            exp1 = data['Close'].ewm(span=12, adjust=False).mean()
-            exp2 = data['Close'].ewm(span=26, adjust=False).mean()
-            macd_line = exp1 - exp2
-            signal_line = macd_line.ewm(span=9, adjust=False).mean()
-            histogram = macd_line - signal_line
-            return {'line': macd_line, 'signal': signal_line, 'histogram': histogram}
+            indicators = self.compute_indicators(data, ticker)
+            return {'line': indicators['MACD_line'], 'signal': indicators['MACD_signal'], 'histogram': indicators['MACD_histogram']}
         except: return None
 
-    def compute_moving_averages(self, data):
+    def compute_moving_averages(self, data, ticker=None):
         """Calculate EXPONENTIAL Moving Averages (EMA) for the entire dataset."""
         try:
-            return {
-                'EMA_20': data['Close'].ewm(span=20, adjust=False).mean(),
-                'EMA_50': data['Close'].ewm(span=50, adjust=False).mean(),
-                'EMA_200': data['Close'].ewm(span=200, adjust=False).mean()
-            }
+            indicators = self.compute_indicators(data, ticker)
+            return {key: indicators[key] for key in ('EMA_20', 'EMA_50', 'EMA_200')}
         except: return None
 
-    def generate_signal(self, rsi_series, macd_data, ema_data, price_series):
-        """Generates a series of signals based on the original logic."""
-        bullish = pd.Series(0, index=price_series.index)
-        bearish = pd.Series(0, index=price_series.index)
-        
-        bullish[rsi_series < 40] += 1
-        bearish[rsi_series > 60] += 1
-        
-        bullish[macd_data['histogram'] > 0] += 1
-        bearish[macd_data['histogram'] < 0] += 1
-        
-        bullish[(price_series > ema_data['EMA_20']) & (ema_data['EMA_20'] > ema_data['EMA_50'])] += 1
-        bearish[(price_series < ema_data['EMA_20']) & (ema_data['EMA_20'] < ema_data['EMA_50'])] += 1
+    def compute_signals(self, rsi_series, macd_data, ema_data, price_series):
+        """Per-bar signals and confidence; inputs are Series for one asset or dates x tickers frames."""
+        bullish, bearish = signal_votes(rsi_series, macd_data['histogram'], price_series, ema_data['EMA_20'], ema_data['EMA_50'])
 
-        signals = pd.Series("Hold", index=price_series.index)
-        signals[bullish >= 2] = "Buy"
-        signals[bearish >= 2] = "Sell"
+        blank = bullish.astype(object)
+        blank[:] = None
+        signals = blank.fillna("Hold").mask(bullish >= 2, "Buy").mask(bearish >= 2, "Sell")
         
-        confidence = pd.Series("Low", index=price_series.index)
-        confidence[abs(bullish - bearish) > 0.5] = "Medium"
-        confidence[abs(bullish - bearish) >= 1.5] = "High"
+        spread = (bullish - bearish).abs()
+        confidence = blank.fillna("Low").mask(spread > 0.5, "Medium").mask(spread >= 1.5, "High")
         
+        return signals, confidence
+
+    def generate_signal(self, rsi_series, macd_data, ema_data, price_series):
+        """Generates a series of signals based on the original logic."""
+        signals, confidence = self.compute_signals(rsi_series, macd_data, ema_data, price_series)
         return signals.iloc[-1], confidence.iloc[-1]
 
+    def screen(self, data, names: dict) -> pd.DataFrame:
+        """Latest indicators and signal for every ticker in a (field, ticker) frame, one row per stock."""
+        prices = data[['Close']].ffill()  # fill holiday gaps so one missing bar does not blank a rolling window
+        rsi = self.compute_rsi(prices)
+        macd_data = self.compute_macd(prices)
+        ema_data = self.compute_moving_averages(prices)
+        signals, confidence = self.compute_signals(rsi, macd_data, ema_data, prices['Close'])
+
+        close = prices['Close']
+        table = pd.DataFrame({
+            "Name": [names.get(ticker, ticker) for ticker in close.columns],
+            "Price": close.iloc[-1],
+            "Change %": (close.iloc[-1] / close.iloc[-2] - 1) * 100 if len(close) > 1 else np.nan,
+            "RSI": rsi.iloc[-1],
+            "MACD Hist": macd_data['histogram'].iloc[-1],
+            "EMA 20": ema_data['EMA_20'].iloc[-1],
+            "EMA 50": ema_data['EMA_50'].iloc[-1],
+            "Signal": signals.iloc[-1],
+            "Confidence": confidence.iloc[-1],
+        }, index=close.columns)
+        summary, _ = backtest_strategies(close)
+        summary = summary.xs(0)
+        table["Backtest %"] = summary['total_return'] * 100
+        table["Buy & Hold %"] = summary['buy_hold_return'] * 100
+        table["Max DD %"] = summary['max_drawdown'] * 100
+        table["Hit Rate %"] = summary['hit_rate'] * 100
+        table.index.name = "Ticker"
+        return table.sort_values("RSI")
+
+    def backtest(self, data, ticker, fee_bps=BACKTEST_FEE_BPS, slippage_bps=BACKTEST_SLIPPAGE_BPS):
+        """Backtests the default strategy on one asset; reuses the indicators memoized for `ticker`."""
+        summary, equity = backtest_strategies(data['Close'].to_frame(ticker), fee_bps=fee_bps, slippage_bps=slippage_bps)
+        return summary.iloc[0], equity.iloc[:, 0]
+
     def scrape_news_headlines(self, company_name: str, ticker: str):
         if not NEWSAPI_KEY: return ["News analysis skipped: API key not configured."]
         try:
@@ -275,18 +987,31 @@ class StockAnalyzer:
         except Exception as e:
             return [f"News for {company_name} unavailable: {e}"]
 
+    def score_headlines(self, headlines):
+        """Scores headlines in one batched forward pass, skipping any found in the sentiment cache."""
+        keys = [SentimentCache.key(SENTIMENT_MODEL, headline) for headline in headlines]
+        scores = sentiment_cache.get_many(keys)
+        pending = {key: headline for key, headline in zip(keys, headlines) if key not in scores}
+        if pending:
+            # The model is only loaded for cache misses.
+            analyzer = self.sentiment_analyzer
+            fresh = dict(zip(pending, analyzer(pending.values())))
+            # Scores from the fallback model are not stored under FinBERT's keys.
+            if analyzer.model == SENTIMENT_MODEL: sentiment_cache.put_many(fresh)
+            scores.update(fresh)
+        return [scores[key] for key in keys]
+
+    def gather_news_sentiment(self, ticker, fallback_name):
+        """Headlines for the ticker's official company name and their sentiment: (headlines, (label, score))."""
+        try: company_name = fetch_ticker_info(ticker).get('longName', fallback_name)
+        except Exception: company_name = fallback_name
+        headlines = self.scrape_news_headlines(company_name, ticker)
+        return headlines, self.analyze_sentiment(headlines)
+
     def analyze_sentiment(self, headlines):
         if not headlines or all("unavailable" in h.lower() for h in headlines): return "Neutral", 0
         try:
-            sentiments = []
-            for headline in headlines:
-                result = self.sentiment_analyzer(headline)
-                if isinstance(result[0], list):
-                    scores = {item['label']: item['score'] for item in result[0]}
-                    sentiments.append(scores.get('positive', 0) - scores.get('negative', 0))
-                else:
-                    score = result[0]['score'] * (1 if result[0]['label'].upper() in ['POSITIVE', 'POS'] else -1)
-                    sentiments.append(score)
+            sentiments = self.score_headlines(headlines)
             avg_sentiment = np.mean(sentiments) if sentiments else 0
             if avg_sentiment > 0.1: return "Positive", avg_sentiment
             elif avg_sentiment < -0.1: return "Negative", avg_sentiment
@@ -313,6 +1038,52 @@ class StockAnalyzer:
 # === MAIN APPLICATION LOGIC ===================================================
 # ==============================================================================
 
+def render_optimizer(stocks: dict, period: str):
+    """Searches RSI/MACD/EMA parameters on a curated list, validating the best ones out of sample."""
+    with st.expander("🧬 Optimize Strategy Parameters"):
+        st.caption("Longer periods (2y, 5y) leave enough bars for both the in-sample search and the out-of-sample check.")
+        col1, col2, col3 = st.columns(3)
+        search = col1.radio("Search:", ["Grid", "Random"], horizontal=True)
+        samples = col1.number_input("Random samples:", min_value=10, max_value=2000, value=100, step=10) if search == "Random" else None
+        objective = col2.selectbox("Rank by (in-sample):", ['sharpe', 'total_return', 'cagr', 'hit_rate'])
+        oos_fraction = col3.slider("Out-of-sample share:", min_value=0.1, max_value=0.5, value=0.3, step=0.05)
+        if not st.button("🧬 Run Optimizer", use_container_width=True): return
+        strategies = parameter_grid(samples=samples)
+        with st.spinner(f"Backtesting {len(strategies)} parameter sets on {len(stocks)} stocks..."):
+            data = fetch_batch_data(tuple(stocks.values()), period)
+            if data is None or data.empty: st.error("Could not fetch data for this list."); return
+            best = optimize_strategy(data['Close'], strategies, objective=objective, oos_fraction=oos_fraction)
+        for name in ('macd_spans', 'ema_spans'): best[name] = best[name].map(lambda spans: '/'.join(map(str, spans)))
+        st.write(f"**Top {len(best)} of {len(strategies)} parameter sets** (metrics are averages across stocks; OOS = last {oos_fraction:.0%} of the period, never used for ranking)")
+        st.dataframe(best, use_container_width=True)
+
+def render_screener(category_name, stocks: dict):
+    """Scans every stock of a curated list and shows the latest signals as a sortable table."""
+    st.header(f"🔍 Screener: {category_name}")
+    period = st.sidebar.selectbox("Data Period:", ['3mo', '6mo', 'ytd', '1y', '2y', '5y'], index=3)
+    render_optimizer(stocks, period)
+    if not st.button("🔍 Run Screener", type="primary", use_container_width=True): return
+    with st.spinner(f"Screening {len(stocks)} stocks..."):
+        data = fetch_batch_data(tuple(stocks.values()), period)
+        if data is None or data.empty: st.error("Could not fetch data for this list."); return
+        if 'analyzer' not in st.session_state: st.session_state.analyzer = StockAnalyzer()
+        names = {ticker: name for name, ticker in stocks.items()}
+        table = st.session_state.analyzer.screen(data, names)
+    missing = [names[ticker] for ticker in stocks.values() if ticker not in table.index]
+    if missing: st.warning(f"No data for: {', '.join(missing)}")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Buy", int((table["Signal"] == "Buy").sum()))
+    col2.metric("Hold", int((table["Signal"] == "Hold").sum()))
+    col3.metric("Sell", int((table["Signal"] == "Sell").sum()))
+    st.dataframe(table, use_container_width=True, column_config={
+        "Price": st.column_config.NumberColumn(format="%.2f"), "Change %": st.column_config.NumberColumn(format="%.2f%%"),
+        "RSI": st.column_config.NumberColumn(format="%.1f"), "MACD Hist": st.column_config.NumberColumn(format="%.3f"),
+        "EMA 20": st.column_config.NumberColumn(format="%.2f"), "EMA 50": st.column_config.NumberColumn(format="%.2f"),
+        "Backtest %": st.column_config.NumberColumn(format="%.1f%%"), "Buy & Hold %": st.column_config.NumberColumn(format="%.1f%%"),
+        "Max DD %": st.column_config.NumberColumn(format="%.1f%%"), "Hit Rate %": st.column_config.NumberColumn(format="%.0f%%"),
+    })
+    st.download_button("📥 Download Screener (CSV)", data=table.to_csv(), file_name=f"{category_name.replace(' ', '_')}_screener.csv", mime="text/csv", use_container_width=True)
+
 def main():
     st.set_page_config(page_title="📈 Elite Trading Analyzer", page_icon="📈", layout="wide")
     st.title("📈 Elite Trading Analyzer")
@@ -325,7 +1096,10 @@ def main():
     if asset_type == "Browse Curated Indian Lists":
         st.sidebar.markdown("---")
         selected_category = st.sidebar.selectbox("Choose Category:", list(STOCK_CATEGORIES.keys()))
-        stock_type = st.sidebar.radio("Analysis Type:", ["Index", "Individual Stock"])
+        stock_type = st.sidebar.radio("Analysis Type:", ["Index", "Individual Stock", "Screen All Stocks"])
+        if stock_type == "Screen All Stocks":
+            render_screener(selected_category, STOCK_CATEGORIES[selected_category]["individual_stocks"])
+            return
         if stock_type == "Index":
             ticker, ticker_name = STOCK_CATEGORIES[selected_category]["ticker"], selected_category
         else:
@@ -354,6 +1128,8 @@ def main():
     st.sidebar.header("⚙️ Settings")
     period_options = ['5d', '1mo', '3mo', '6mo', 'ytd', '1y', '2y', '5y', 'max']
     period = st.sidebar.selectbox("Data Period:", period_options, index=5)
+    fee_bps = st.sidebar.number_input("Backtest Fees (bps per side):", min_value=0.0, value=float(BACKTEST_FEE_BPS), step=1.0)
+    slippage_bps = st.sidebar.number_input("Backtest Slippage (bps per side):", min_value=0.0, value=float(BACKTEST_SLIPPAGE_BPS), step=1.0)
 
     if 'analyzer' not in st.session_state: st.session_state.analyzer = StockAnalyzer()
     if 'sheets_client' not in st.session_state: st.session_state.sheets_client = setup_google_sheets()
@@ -361,24 +1137,33 @@ def main():
     if st.button("📈 Run Analysis", type="primary", use_container_width=True):
         with st.spinner(f"Running analysis for {ticker_name} ({ticker})..."):
             try:
-                data = fetch_stock_data(ticker, period)
+                # --- Gather data concurrently: company info, prices, and news + sentiment (which reuses the info request) ---
+                info_future = submit_with_context(fetch_ticker_info, ticker)
+                data_future = submit_with_context(fetch_stock_data, ticker, period)
+                news_future = submit_with_context(st.session_state.analyzer.gather_news_sentiment, ticker, ticker_name)
+                try: info = info_future.result()
+                except Exception as e: st.error(f"Error fetching data for '{ticker}': {e}"); st.stop()
+                if not info.get('longName') and not info.get('shortName'):
+                    st.error(f"Ticker '{ticker}' not found or is invalid."); st.stop()
+                data = data_future.result()
                 if data is None or data.empty: st.error("Could not fetch data for this asset. Please try another."); st.stop()
                 
-                official_company_name = yf.Ticker(ticker).info.get('longName', ticker_name)
+                official_company_name = info.get('longName', ticker_name)
                 st.header(f"Analysis for: {official_company_name} ({ticker})")
 
                 # --- Run Vectorized Analysis on the whole dataset ---
-                rsi_series = st.session_state.analyzer.compute_rsi(data)
-                macd_data = st.session_state.analyzer.compute_macd(data)
-                ema_data = st.session_state.analyzer.compute_moving_averages(data)
+                # One memoized engine pass per (ticker, bars); the chart below reuses it.
+                rsi_series = st.session_state.analyzer.compute_rsi(data, ticker=ticker)
+                macd_data = st.session_state.analyzer.compute_macd(data, ticker=ticker)
+                ema_data = st.session_state.analyzer.compute_moving_averages(data, ticker=ticker)
 
-                headlines = st.session_state.analyzer.scrape_news_headlines(official_company_name, ticker)
-                sentiment_label, sentiment_score = st.session_state.analyzer.analyze_sentiment(headlines)
-                
                 # Get the latest signal by passing the entire data series to the signal generator
                 signal, confidence = st.session_state.analyzer.generate_signal(rsi_series, macd_data, ema_data, data['Close'])
                 
-                ai_summary = st.session_state.analyzer.get_ai_summary(
+                headlines, (sentiment_label, sentiment_score) = news_future.result()
+                # The AI summary is written while the charts below render.
+                ai_future = submit_with_context(
+                    st.session_state.analyzer.get_ai_summary,
                     official_company_name, rsi_series.iloc[-1], 
                     {k: v.iloc[-1] for k, v in macd_data.items()}, 
                     signal, confidence, sentiment_label, headlines
@@ -395,7 +1180,7 @@ def main():
                 col4.metric("News Sentiment", f"{sentiment_label}", f"Score: {sentiment_score:.2f}")
 
                 st.subheader("📈 Custom Analysis Chart")
-                st.plotly_chart(create_plotly_charts(data, official_company_name), use_container_width=True)
+                st.plotly_chart(create_plotly_charts(data, official_company_name, st.session_state.analyzer.compute_indicators(data, ticker)), use_container_width=True)
 
                 st.subheader("💡 Indicator Details")
                 col1, col2 = st.columns(2)
@@ -410,6 +1195,21 @@ def main():
                     st.write(f"• Signal Line: {macd_data['signal'].iloc[-1]:.4f}")
                     st.write(f"• Histogram: {macd_data['histogram'].iloc[-1]:.4f}")
 
+                st.subheader("🧪 Strategy Backtest")
+                results, equity = st.session_state.analyzer.backtest(data, ticker, fee_bps, slippage_bps)
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Strategy Return", f"{results['total_return']:.1%}", f"Buy & Hold: {results['buy_hold_return']:.1%}", delta_color="off")
+                col2.metric("Max Drawdown", f"{results['max_drawdown']:.1%}")
+                col3.metric("Hit Rate", f"{results['hit_rate']:.0%}" if results['trades'] else "N/A", f"{int(results['trades'])} trades", delta_color="off")
+                col4.metric("Time in Market", f"{results['exposure']:.0%}")
+                equity_fig = go.Figure([
+                    go.Scatter(x=equity.index, y=equity, mode='lines', name='Strategy'),
+                    go.Scatter(x=data.index, y=data['Close'] / data['Close'].iloc[0], mode='lines', name='Buy & Hold'),
+                ])
+                equity_fig.update_layout(height=350, template='plotly_dark', yaxis_title="Growth of 1", title_text=f"Fees {fee_bps:g} bps + slippage {slippage_bps:g} bps per side")
+                st.plotly_chart(equity_fig, use_container_width=True)
+
+                ai_summary = ai_future.result()
                 st.subheader("🤖 AI Strategy Summary"); st.info(ai_summary)
                 
                 st.subheader("📰 Recent News Headlines")
@@ -426,7 +1226,7 @@ def main():
                 
                 
                 log_data = [datetime.now().strftime('%Y-%m-%d %H:%M:%S'), ticker, signal, confidence, f"{rsi_series.iloc[-1]:.2f}", sentiment_label, ai_summary[:500]]
-                if log_to_sheets(st.session_state.sheets_client, log_data): st.success("✅ Results logged to Google Sheets.")
+                if log_to_sheets(st.session_state.sheets_client, log_data): st.success("✅ Results queued for Google Sheets.")
                 
                 report_data = {
                     "Asset": official_company_name, "Ticker": ticker, "Analysis_Date": datetime.now(),
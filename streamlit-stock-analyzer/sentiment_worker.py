@@ -0,0 +1,57 @@
+"""Headline sentiment scoring for app.py, in-process or in the optional inference worker process.
+
+Kept out of app.py so the worker can be started with the `spawn` context: a spawned child imports
+this module by name, which it cannot do with functions defined in the Streamlit script.
+"""
+
+import queue
+import threading
+import time
+
+from transformers import pipeline
+
+
+class SentimentModel:
+    """A sentiment pipeline (the default model if `name` cannot be loaded), scoring headlines in this process."""
+
+    def __init__(self, name, batch_size):
+        try: self.pipeline, self.model = pipeline("sentiment-analysis", model=name, return_all_scores=True), name
+        except: self.pipeline, self.model = pipeline("sentiment-analysis"), "default"
+        self.batch_size = batch_size
+        self.lock = threading.Lock()  # the pipeline's tokenizer cannot be used from two threads at once
+
+    def __call__(self, headlines) -> list:
+        """Signed scores of the headlines, in one batched forward pass."""
+        with self.lock:
+            results = self.pipeline(list(headlines), batch_size=self.batch_size, padding=True, truncation=True)
+        return [self.headline_score(result) for result in results]
+
+    @staticmethod
+    def headline_score(result):
+        """Signed score of one pipeline result: FinBERT's positive minus negative, or the top label's score."""
+        if isinstance(result, list):
+            scores = {item['label']: item['score'] for item in result}
+            return scores.get('positive', 0) - scores.get('negative', 0)
+        return result['score'] * (1 if result['label'].upper() in ['POSITIVE', 'POS'] else -1)
+
+
+def serve(requests, responses, name, batch_size, wait, max_batch):
+    """Inference worker entry point: loads the model once, reports its name, then scores requests from
+    all sessions together, collecting whatever arrives within `wait` seconds (up to `max_batch`
+    headlines) into one batch."""
+    model = SentimentModel(name, batch_size)
+    responses.put((None, model.model, None))
+    while True:
+        batch = [requests.get()]
+        deadline = time.monotonic() + wait
+        while sum(len(headlines) for _, headlines in batch) < max_batch:
+            try: batch.append(requests.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty: break
+        try:
+            scores = model([headline for _, headlines in batch for headline in headlines])
+        except Exception as e:
+            for request_id, _ in batch: responses.put((request_id, None, str(e)))
+            continue
+        for request_id, headlines in batch:
+            responses.put((request_id, scores[:len(headlines)], None))
+            scores = scores[len(headlines):]